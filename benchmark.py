@@ -0,0 +1,486 @@
+# benchmark.py
+"""QuickKV 性能基准（不依赖 GUI，在临时目录中生成数据库）
+
+用法: python benchmark.py [--rows 100000] [--sizes 1000 10000 100000] [--json 结果.json] [用例名 ...]
+layouts 用例需要 PySide6，未安装时跳过。
+所有数据由固定种子生成，--json 把每项结果连同版本与环境信息写成 JSON，便于在版本之间比较。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import database
+import data_io
+import engine
+from search_index import SearchIndex
+
+CASES = {}
+RESULTS = []  # report() 记录的全部结果，供 --json 输出
+_current_case = None
+
+def case(name):
+    """注册一个基准用例：func(args, workdir) -> None"""
+    def decorator(func):
+        CASES[name] = func
+        return func
+    return decorator
+
+def random_text(rng, min_len=4, max_len=16):
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(min_len, max_len)))
+
+def use_db(path):
+    """让 database 模块切换到 path 并建好表"""
+    database.close_db()
+    database.DB_FILE = path
+    database.ensure_db_tables()
+
+def gen_items(rng, count):
+    """count 条 replace_all_items 接受的扁平数据 (text, parent_id, is_group, sort_order)"""
+    return [(random_text(rng), 0, 0, (i + 1) * database.SORT_GAP) for i in range(count)]
+
+def gen_markdown_lines(rng, count):
+    """约 count 行条目的 Markdown 导出内容（内存中的行列表），键和值各占一半"""
+    lines = ["# QuickKV 数据导出\n", "\n"]
+    for _, title in data_io.SECTIONS:
+        lines.append(f"## --- {title} ---\n")
+        lines.append("\n")
+        lines.extend(f"- {random_text(rng)}\n" for _ in range(count // 2))
+        lines.append("\n")
+    return lines
+
+def gen_rows(rng, count, values_per_group=3):
+    """count 行主界面输入：每个 PRIMARY 行后跟 values_per_group - 1 个 SECONDARY 行"""
+    rows = []
+    for i in range(count):
+        if i % values_per_group:
+            rows.append(("SECONDARY", rng.choice(",;|"), random_text(rng)))
+        else:
+            rows.append(("PRIMARY", random_text(rng), random_text(rng)))
+    return rows
+
+def fill_flat(rows, seed=0):
+    """向 keys / value_items 各写入 rows 条扁平数据"""
+    rng = random.Random(seed)
+    for table in ("keys", "value_items"):
+        database.replace_all_items(table, gen_items(rng, rows))
+
+def measure(func, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        func(i)
+    elapsed = time.perf_counter() - start
+    return repeat / elapsed if elapsed else float("inf")
+
+def report(label, value, unit="ops/s"):
+    print(f"  {label:<40} {value:>12.1f} {unit}")
+    RESULTS.append({"case": _current_case, "name": label.strip(), "value": round(value, 3), "unit": unit})
+
+def timed(func):
+    """运行一次 func，返回耗时毫秒"""
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+# --- 旧版：每次调用都新建连接 ---
+def legacy_get_all_items(path):
+    conn = sqlite3.connect(path)
+    items = conn.execute("SELECT id, key_text, parent_id, is_group, sort_order FROM keys ORDER BY parent_id, sort_order").fetchall()
+    conn.close()
+    return items
+
+def legacy_update_item_text(path, item_id, text):
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE keys SET key_text = ? WHERE id = ?", (text, item_id))
+    conn.commit()
+    conn.close()
+
+def legacy_add_item(path, text):
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO keys (key_text, parent_id, is_group) VALUES (?, 0, 0)", (text,))
+    conn.commit()
+    conn.close()
+
+@case("connection")
+def bench_connection(args, workdir):
+    """每次调用新建连接 vs 长连接管理器"""
+    path = os.path.join(workdir, "connection.db")
+    use_db(path)
+    fill_flat(args.rows)
+    ids = [row[0] for row in database.get_all_items("keys")]
+    rng = random.Random(1)
+    database.close_db()
+
+    print(f"[connection] rows={args.rows}")
+    report("legacy get_all_items", measure(lambda i: legacy_get_all_items(path), 5))
+    report("legacy update_item_text", measure(lambda i: legacy_update_item_text(path, rng.choice(ids), random_text(rng)), 200))
+    report("legacy add_item", measure(lambda i: legacy_add_item(path, random_text(rng)), 200))
+
+    use_db(path)
+    report("pooled get_all_items", measure(lambda i: database.get_all_items("keys"), 5))
+    report("pooled update_item_text", measure(lambda i: database.update_item_text("keys", rng.choice(ids), random_text(rng)), 200))
+    report("pooled add_item", measure(lambda i: database.add_item("keys", random_text(rng)), 200))
+    database.close_db()
+
+def fill_tree(table_name, nodes, levels, seed=0):
+    """生成 nodes 个节点、levels 层的树，返回根节点 id"""
+    rng = random.Random(seed)
+    field_name = "key_text" if table_name == "keys" else "value_text"
+    per_level = max(1, (nodes - 1) // max(1, levels - 1))
+    rows = [(1, "root", 0, 1, 0)]
+    previous_level = [1]
+    next_id = 2
+    while next_id <= nodes:
+        current_level = []
+        for _ in range(per_level):
+            if next_id > nodes:
+                break
+            rows.append((next_id, random_text(rng), rng.choice(previous_level), 1, next_id))
+            current_level.append(next_id)
+            next_id += 1
+        previous_level = current_level
+    with database.get_manager().transaction() as conn:
+        conn.execute(f"DELETE FROM {table_name}")
+        conn.executemany(f"INSERT INTO {table_name} (id, {field_name}, parent_id, is_group, sort_order) VALUES (?, ?, ?, ?, ?)", rows)
+    return 1
+
+@case("subtree")
+def bench_subtree(args, workdir):
+    """递归 CTE 子树计数/删除，节点数翻倍时耗时应近似翻倍"""
+    use_db(os.path.join(workdir, "subtree.db"))
+    print("[subtree] levels=20")
+    for nodes in (12500, 25000, 50000):
+        root_id = fill_tree("keys", nodes, 20)
+        start = time.perf_counter()
+        count = database.count_subtree("keys", root_id)
+        counted = time.perf_counter() - start
+        start = time.perf_counter()
+        database.delete_item_recursive("keys", root_id)
+        deleted = time.perf_counter() - start
+        report(f"count_subtree nodes={count}", counted * 1000, "ms")
+        report(f"delete_item_recursive nodes={nodes}", deleted * 1000, "ms")
+    database.close_db()
+
+@case("reorder")
+def bench_reorder(args, workdir):
+    """拖动单项后的排序持久化：首次整体重排，之后每次只写一行"""
+    use_db(os.path.join(workdir, "reorder.db"))
+    fill_flat(args.rows)
+    rng = random.Random(2)
+    id_order = [row[0] for row in database.get_all_items("keys")]
+    print(f"[reorder] rows={args.rows}")
+    for attempt in range(4):
+        item_id = id_order.pop(rng.randrange(len(id_order)))
+        id_order.insert(rng.randrange(len(id_order) + 1), item_id)
+        start = time.perf_counter()
+        _, msg = database.update_sort_order("keys", id_order)
+        report(f"move #{attempt + 1} ({msg})", (time.perf_counter() - start) * 1000, "ms")
+    database.close_db()
+
+@case("cache")
+def bench_cache(args, workdir):
+    """get_all_items 缓存命中与写入后重新加载"""
+    use_db(os.path.join(workdir, "cache.db"))
+    fill_flat(args.rows)
+    rng = random.Random(3)
+    print(f"[cache] rows={args.rows}")
+    database.get_all_items("keys")
+    report("get_all_items (cache hit)", measure(lambda i: database.get_all_items("keys"), 50))
+    def edit_then_read(i):
+        database.add_item("keys", random_text(rng))
+        database.get_all_items("keys")
+    report("add_item + get_all_items (reload)", measure(edit_then_read, 5))
+    database.close_db()
+
+@case("search")
+def bench_search(args, workdir):
+    """逐键输入时每次查询的延迟：三元组索引 vs 旧的逐项 lower()+in 扫描"""
+    rng = random.Random(4)
+    print("[search] 每次按键的平均延迟")
+    for size in args.search_sizes:
+        items = [(i, random_text(rng, 6, 20), 0, 0, i) for i in range(size)]
+        index = SearchIndex()
+        start = time.perf_counter()
+        index.reset_items(items)
+        report(f"build index size={size}", (time.perf_counter() - start) * 1000, "ms")
+        queries = []
+        for _ in range(20):
+            text = rng.choice(items)[1]
+            begin = rng.randrange(max(1, len(text) - 5))
+            word = text[begin:begin + 5]
+            queries.extend(word[:n] for n in range(1, len(word) + 1))
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query, 20)
+        report(f"SearchIndex.search size={size}", (time.perf_counter() - start) * 1000 / len(queries), "ms")
+        texts = [item[1] for item in items]
+        start = time.perf_counter()
+        for query in queries[:10]:
+            [text for text in texts if query.lower() in text.lower()]
+        report(f"linear scan size={size}", (time.perf_counter() - start) * 1000 / 10, "ms")
+
+@case("fts")
+def bench_fts(args, workdir):
+    """database.search_items（FTS5 trigram / NOCASE 前缀索引）每次查询的延迟"""
+    use_db(os.path.join(workdir, "fts.db"))
+    fill_flat(args.rows)
+    rng = random.Random(5)
+    texts = [row[1] for row in database.get_all_items("keys")]
+    queries = []
+    for _ in range(20):
+        text = rng.choice(texts)
+        queries.extend(text[:n] for n in range(1, min(len(text), 6) + 1))
+    print(f"[fts] rows={args.rows} fts={database.fts_available()}")
+    start = time.perf_counter()
+    for query in queries:
+        database.search_items("keys", query, 20)
+    report("search_items", (time.perf_counter() - start) * 1000 / len(queries), "ms")
+    database.close_db()
+
+def write_markdown(path, lines, seed=0):
+    """生成约 lines 行条目的 Markdown 导出文件，键和值各占一半"""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# QuickKV 数据导出\n\n")
+        for _, title in data_io.SECTIONS:
+            f.write(f"## --- {title} ---\n\n")
+            for _ in range(lines // 2):
+                f.write(f"- {random_text(rng)}\n")
+            f.write("\n")
+
+def traced(func):
+    """运行 func，返回 (耗时秒, Python 堆峰值字节)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        func()
+        return time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+@case("markdown")
+def bench_markdown(args, workdir):
+    """流式 Markdown 导入/导出的耗时与内存峰值"""
+    use_db(os.path.join(workdir, "markdown.db"))
+    source = os.path.join(workdir, "import.md")
+    write_markdown(source, args.md_lines)
+    print(f"[markdown] lines={args.md_lines}")
+    def legacy_parse():
+        with open(source, encoding="utf-8") as f:
+            lines = f.readlines()
+        keys, values = [], []
+        for table_name, text in data_io.iter_md_entries(lines):
+            (keys if table_name == "keys" else values).append((text, 0, 0, 0))
+    elapsed, peak = traced(legacy_parse)
+    report("legacy readlines+parse (no DB write)", elapsed * 1000, "ms")
+    report("  peak memory", peak / 1e6, "MB")
+    elapsed, peak = traced(lambda: data_io.import_markdown(source))
+    report("import_markdown", elapsed * 1000, "ms")
+    report("  peak memory", peak / 1e6, "MB")
+    elapsed, peak = traced(lambda: data_io.export_markdown(os.path.join(workdir, "export.md")))
+    report("export_markdown", elapsed * 1000, "ms")
+    report("  peak memory", peak / 1e6, "MB")
+    with open(source, "a", encoding="utf-8") as f:
+        f.write("- 合并导入新增的一行\n")
+    wal = database.DB_FILE + "-wal"
+    database.get_manager().writer().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    start = time.perf_counter()
+    stats = data_io.merge_markdown(source)
+    report("merge_markdown (1 new line)", (time.perf_counter() - start) * 1000, "ms")
+    report(f"  inserted={stats['value_items']['inserted']} WAL written", os.path.getsize(wal) / 1e3, "KB")
+    database.close_db()
+
+@case("jsonl")
+def bench_jsonl(args, workdir):
+    """JSONL（含校验、可 gzip 压缩）与 Markdown 的导出/覆盖导入对比"""
+    use_db(os.path.join(workdir, "jsonl.db"))
+    source = os.path.join(workdir, "source.md")
+    write_markdown(source, args.md_lines, seed=1)
+    data_io.import_markdown(source)
+    print(f"[jsonl] lines={args.md_lines}")
+    for label, name, export, load in (
+        ("markdown", "export.md", lambda path: data_io.export_markdown(path), data_io.import_markdown),
+        ("jsonl", "export.jsonl", data_io.export_jsonl, data_io.import_jsonl),
+        ("jsonl.gz", "export.jsonl.gz", data_io.export_jsonl, data_io.import_jsonl),
+    ):
+        path = os.path.join(workdir, name)
+        report(f"export {label}", timed(lambda: export(path)), "ms")
+        report(f"  file size {label}", os.path.getsize(path) / 1e6, "MB")
+        report(f"import {label}", timed(lambda: load(path)), "ms")
+    database.close_db()
+
+@case("layouts")
+def bench_layouts(args, workdir):
+    """切换组合的耗时（需要 PySide6，以 offscreen 平台运行，QSettings 写到临时目录）"""
+    try:
+        from PySide6.QtCore import QSettings
+        from PySide6.QtWidgets import QApplication
+    except ImportError:
+        print("[layouts] 未安装 PySide6，跳过")
+        return
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication.instance() or QApplication([])
+    QSettings.setDefaultFormat(QSettings.IniFormat)
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, workdir)
+    import main as app_main
+    use_db(os.path.join(workdir, "layouts.db"))
+    rng = random.Random(6)
+    for rows in args.layout_sizes:
+        for suffix in ("a", "b"):
+            layout_rows = []
+            for i in range(rows):
+                if i % 3:
+                    layout_rows.append(database.LayoutRow("SECONDARY", "", ",", random_text(rng)))
+                else:
+                    layout_rows.append(database.LayoutRow("PRIMARY", random_text(rng), "", random_text(rng)))
+            database.save_layout_rows(f"{rows}-{suffix}", layout_rows)
+    window = app_main.MainWindow()
+    window.show()
+    print(f"[layouts] sizes={args.layout_sizes}")
+    for rows in args.layout_sizes:
+        names = [f"{rows}-a", f"{rows}-b"]
+        def switch(i):
+            window.layout_combo.setCurrentIndex(window.layout_combo.findText(names[i % 2]))
+            app.processEvents()
+        switch(1)  # 预热：首次切换会新建行，之后从对象池复用
+        report(f"switch layout rows={rows}", 1000 / measure(switch, 10), "ms")
+    window.close()
+    app.processEvents()
+    database.close_db()
+
+@case("read")
+def bench_read(args, workdir):
+    """get_all_items 在各排序方式下的冷读取（每次先清空 item_cache）"""
+    use_db(os.path.join(workdir, "read.db"))
+    print(f"[read] sizes={args.sizes}")
+    for size in args.sizes:
+        fill_flat(size)
+        for sort_mode in ("tree", "alpha_asc", "alpha_desc"):
+            def cold_read(i):
+                database.item_cache.clear()
+                database.get_all_items("keys", sort_mode)
+            report(f"get_all_items {sort_mode} size={size}", 1000 / measure(cold_read, 5), "ms")
+    database.close_db()
+
+@case("write")
+def bench_write(args, workdir):
+    """add_item / update_item_text 的单条事务吞吐，表越大越能暴露索引维护的开销"""
+    use_db(os.path.join(workdir, "write.db"))
+    rng = random.Random(7)
+    print(f"[write] sizes={args.sizes}")
+    for size in args.sizes:
+        fill_flat(size)
+        ids = database.get_item_ids("keys")
+        report(f"add_item size={size}", measure(lambda i: database.add_item("keys", f"{random_text(rng)}-{i}"), 200))
+        report(f"update_item_text size={size}", measure(lambda i: database.update_item_text("keys", rng.choice(ids), random_text(rng)), 200))
+    database.close_db()
+
+@case("deep_delete")
+def bench_deep_delete(args, workdir):
+    """delete_item_recursive 删除一条深度等于节点数的链（最深的树）"""
+    use_db(os.path.join(workdir, "deep_delete.db"))
+    print(f"[deep_delete] sizes={args.sizes}")
+    for size in args.sizes:
+        root_id = fill_tree("keys", size, size)
+        report(f"delete_item_recursive depth={size}", timed(lambda: database.delete_item_recursive("keys", root_id)), "ms")
+    database.close_db()
+
+@case("replace")
+def bench_replace(args, workdir):
+    """replace_all_items 整表导入"""
+    use_db(os.path.join(workdir, "replace.db"))
+    rng = random.Random(8)
+    print(f"[replace] sizes={args.sizes}")
+    for size in args.sizes:
+        items = gen_items(rng, size)
+        report(f"replace_all_items size={size}", timed(lambda: database.replace_all_items("keys", items)), "ms")
+    database.close_db()
+
+@case("undo")
+def bench_undo(args, workdir):
+    """撤销 / 重做：单条编辑只回放改动的行，整表导入从快照恢复"""
+    use_db(os.path.join(workdir, "undo.db"))
+    rng = random.Random(11)
+    print(f"[undo] sizes={args.sizes}")
+    for size in args.sizes:
+        fill_flat(size)
+        ids = database.get_item_ids("keys")
+        database.update_item_text("keys", rng.choice(ids), random_text(rng))
+        report(f"undo edit size={size}", timed(database.undo), "ms")
+        report(f"redo edit size={size}", timed(database.redo), "ms")
+        database.undo()  # 回到 fill_flat 之后，下一次撤销的是整表导入
+        report(f"undo replace_all_items size={size}", timed(database.undo), "ms")
+        report(f"redo replace_all_items size={size}", timed(database.redo), "ms")
+    database.close_db()
+
+@case("parse_md")
+def bench_parse_md(args, workdir):
+    """导入前的 Markdown 解析（data_io.parse_md_lines，即 ManagementDialog.parse_md_content）"""
+    rng = random.Random(9)
+    print(f"[parse_md] sizes={args.sizes}")
+    for size in args.sizes:
+        lines = gen_markdown_lines(rng, size)
+        report(f"parse_md_lines lines={size}", timed(lambda: data_io.parse_md_lines(lines)), "ms")
+
+@case("format")
+def bench_format(args, workdir):
+    """输出引擎把输入行拼成复制文本"""
+    rng = random.Random(10)
+    print(f"[format] sizes={args.sizes}")
+    for size in args.sizes:
+        rows = gen_rows(rng, size)
+        report(f"engine.format_rows rows={size}", 1000 / measure(lambda i: engine.format_rows(rows), 10), "ms")
+
+def write_results(path, args, names):
+    """把 RESULTS 连同版本与环境信息写成 JSON"""
+    payload = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "db_version": database.APP_DB_VERSION,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cases": names,
+        "args": {key: value for key, value in vars(args).items() if key not in ("cases", "json")},
+        "results": RESULTS,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+def main(argv=None):
+    global _current_case
+    parser = argparse.ArgumentParser(description="QuickKV 性能基准")
+    parser.add_argument("cases", nargs="*", help=f"要运行的用例（默认全部）: {', '.join(CASES)}")
+    parser.add_argument("--rows", type=int, default=100000, help="每张表的数据行数")
+    parser.add_argument("--md-lines", type=int, default=1000000, help="markdown 用例的文件行数")
+    parser.add_argument("--search-sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="search 用例的词条数")
+    parser.add_argument("--layout-sizes", type=int, nargs="+", default=[10, 100, 1000], help="layouts 用例每个组合的行数")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="read / write / deep_delete / replace / undo / parse_md / format 用例的数据规模")
+    parser.add_argument("--json", help="把结果写入该 JSON 文件")
+    args = parser.parse_args(argv)
+    names = args.cases or list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"未知用例: {', '.join(unknown)}")
+    original_db = database.DB_FILE
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            for name in names:
+                _current_case = name
+                CASES[name](args, workdir)
+        finally:
+            database.close_db()
+            database.DB_FILE = original_db
+    if args.json:
+        write_results(args.json, args, names)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# data_io.py
+"""数据导入/导出（流式处理，不依赖 GUI）"""
+import gzip
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+
+import database
+
+SECTIONS = (("keys", "键 (Keys)"), ("value_items", "值 (Values)"))
+WRITE_BUFFER_SIZE = 1 << 20  # 导出时的写缓冲
+IMPORT_CHUNK_SIZE = 5000     # 导入时每次 executemany 的行数
+PROGRESS_STEP = 10000        # 每处理这么多行回调一次进度
+JSONL_FORMAT = "quickkv-jsonl"
+JSONL_VERSION = 1
+JSONL_CHUNK_ROWS = 10000     # JSONL 每块的行数，每块之后写一行校验
+JSONL_GZIP_LEVEL = 6
+
+# <<< Markdown >>>
+def iter_md_entries(lines):
+    """逐行解析 Markdown，产出 (table_name, text)；lines 可以是文件对象等任意行迭代器"""
+    table_name = None
+    for line in lines:
+        if line.startswith("## --- 键"):
+            table_name = "keys"
+            continue
+        elif line.startswith("## --- 值"):
+            table_name = "value_items"
+            continue
+        if table_name is None:
+            continue
+        stripped = line.strip()
+        if not stripped.startswith('-'):
+            continue
+        text = stripped[1:].strip()
+        if text:
+            yield table_name, text
+
+def parse_md_lines(lines):
+    """把整份 Markdown 解析为 (keys_data, values_data)，每项为 replace_all_items 接受的 (text, parent_id, is_group, sort_order)"""
+    keys_data, values_data = [], []
+    for table_name, text in iter_md_entries(lines):
+        current_list = keys_data if table_name == "keys" else values_data
+        current_list.append((text, 0, 0, (len(current_list) + 1) * database.SORT_GAP))
+    return keys_data, values_data
+
+def export_markdown(path, sort_modes=None, progress=None):
+    """
+    把两张表直接从数据库游标写入 path。sort_modes: {table_name: sort_mode}，默认树序。
+    progress(done, total) 按行数回调。返回写出的行数。
+    """
+    sort_modes = sort_modes or {}
+    total = sum(database.count_items(table_name) for table_name, _ in SECTIONS)
+    done = 0
+    with open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(f"# QuickKV 数据导出 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        for table_name, title in SECTIONS:
+            f.write(f"## --- {title} ---\n\n")
+            for _, text in database.iter_items(table_name, sort_modes.get(table_name, "tree")):
+                f.write(f"- {text}\n")
+                done += 1
+                if progress and done % PROGRESS_STEP == 0:
+                    progress(done, total)
+            f.write("\n")
+    if progress:
+        progress(done, total)
+    return done
+
+def _read_lines(f, total, progress):
+    read = 0
+    for number, raw in enumerate(f, 1):
+        read += len(raw)
+        if progress and number % PROGRESS_STEP == 0:
+            progress(read, total)
+        yield raw.decode("utf-8")
+    if progress:
+        progress(total, total)
+
+def import_markdown(path, progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    逐行读取 path 并在一个事务中覆盖两张表。progress(已读字节, 文件字节) 回调；
+    回调中抛出异常即可中止并回滚。返回 {table_name: 导入行数}。
+    """
+    with open(path, "rb") as f:
+        lines = _read_lines(f, os.path.getsize(path), progress)
+        return database.replace_all_items_stream(iter_md_entries(lines), chunk_size)
+
+def merge_markdown(path, remove_missing=False, progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    逐行读取 path 并合并到现有数据：只写入新增（以及 remove_missing 时删除缺失）的条目，
+    保留现有条目的 id 和分组结构。返回 database.merge_items_stream 的统计结果。
+    """
+    with open(path, "rb") as f:
+        lines = _read_lines(f, os.path.getsize(path), progress)
+        return database.merge_items_stream(iter_md_entries(lines), remove_missing, chunk_size)
+
+# <<< JSONL：完整保留 id、分组和排序的结构化格式 >>>
+# 第一行为文件头 {"format", "version", "db_version", "exported", "rows": {表名: 行数}}；
+# 每张表以 {"table": 表名} 开始，其后每行一个 [id, text, parent_id, is_group, sort_order]，
+# 每 JSONL_CHUNK_ROWS 行（以及每张表末尾）跟一行 {"chunk": 序号, "rows": 行数, "crc32": 校验值}，
+# 校验值为该块各行原始字节（含换行）的 CRC-32；最后一行 {"end": true, "rows": {...}} 用于发现截断。
+# 路径以 .gz 结尾时整份文件用 gzip 压缩。
+
+def _open_jsonl(path, mode):
+    if path.endswith(".gz"):
+        raw = gzip.open(path, mode, compresslevel=JSONL_GZIP_LEVEL) if mode == "wb" else gzip.open(path, mode)
+        return io.BufferedWriter(raw, WRITE_BUFFER_SIZE) if mode == "wb" else io.BufferedReader(raw, WRITE_BUFFER_SIZE)
+    return open(path, mode, buffering=WRITE_BUFFER_SIZE)
+
+def _control_line(obj):
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+def export_jsonl(path, progress=None):
+    """
+    把两张表的完整行（含分组项）按 id 顺序写入 path，每块附 CRC-32 校验。
+    progress(done, total) 按行数回调。返回写出的行数。
+    """
+    encode = json.encoder.encode_basestring  # 只有文本需要 JSON 转义，整数直接格式化
+    totals = {table_name: database.count_items(table_name, include_groups=True) for table_name, _ in SECTIONS}
+    total = sum(totals.values())
+    done = 0
+    with _open_jsonl(path, "wb") as f:
+        f.write(_control_line({"format": JSONL_FORMAT, "version": JSONL_VERSION, "db_version": database.APP_DB_VERSION,
+                               "exported": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "rows": totals}))
+        chunk_number = 0
+        for table_name, _ in SECTIONS:
+            f.write(_control_line({"table": table_name}))
+            chunk = []
+            def flush():
+                nonlocal chunk_number
+                data = "".join(chunk).encode("utf-8")
+                f.write(data)
+                f.write(_control_line({"chunk": chunk_number, "rows": len(chunk), "crc32": zlib.crc32(data)}))
+                chunk_number += 1
+                chunk.clear()
+            for row in database.iter_rows(table_name):
+                item_id, text, parent_id, is_group, sort_order = row
+                chunk.append(f"[{item_id},{encode(text)},{parent_id},{is_group},{sort_order}]\n")
+                if len(chunk) >= JSONL_CHUNK_ROWS:
+                    flush()
+                    done += JSONL_CHUNK_ROWS
+                    if progress: progress(done, total)
+            if chunk:
+                done += len(chunk)
+                flush()
+        f.write(_control_line({"end": True, "rows": totals}))
+    if progress:
+        progress(done, total)
+    return done
+
+def iter_jsonl_rows(f, progress=None):
+    """
+    逐块校验并产出 (table_name, id, text, parent_id, is_group, sort_order)；f 为以二进制打开的 JSONL 文件。
+    一块的行只在其校验通过后才产出，并且整块一次交给 json.loads 解析；
+    格式错误、校验失败或文件被截断时抛出 ValueError。
+    progress(已读行数, 文件头中的总行数) 回调。
+    """
+    header = json.loads(next(f, b"{}"))
+    if header.get("format") != JSONL_FORMAT:
+        raise ValueError("不是 QuickKV JSONL 文件")
+    if header.get("version", 0) > JSONL_VERSION:
+        raise ValueError(f"不支持的 JSONL 版本: {header.get('version')}")
+    total = sum(header.get("rows", {}).values())
+    table_name, pending, crc, done = None, [], 0, 0
+    counts = {name: 0 for name, _ in SECTIONS}
+    for number, line in enumerate(f, 2):
+        if line.startswith(b"["):
+            if table_name is None:
+                raise ValueError(f"第 {number} 行: 数据行之前缺少表名")
+            crc = zlib.crc32(line, crc)
+            pending.append(line)
+            continue
+        control = json.loads(line)
+        if "chunk" in control:
+            if control.get("rows") != len(pending) or control.get("crc32") != crc:
+                raise ValueError(f"第 {control['chunk']} 块（截至第 {number} 行）校验失败，文件可能已损坏")
+            rows = json.loads(b"[" + b",".join(pending) + b"]")
+            if any(len(row) != 5 for row in rows):
+                raise ValueError(f"第 {control['chunk']} 块: 数据行应为 [id, text, parent_id, is_group, sort_order]")
+            for row in rows:
+                yield (table_name, *row)
+            counts[table_name] += len(pending)
+            done += len(pending)
+            pending, crc = [], 0
+            if progress: progress(done, total)
+        elif "table" in control:
+            if pending:
+                raise ValueError(f"第 {number} 行: 上一块缺少校验行")
+            if control["table"] not in counts:
+                raise ValueError(f"第 {number} 行: 未知的表 {control['table']}")
+            table_name = control["table"]
+        elif control.get("end"):
+            if pending or control.get("rows") != counts:
+                raise ValueError("文件结尾的行数与内容不一致")
+            return
+    raise ValueError("文件不完整：缺少结尾标记")
+
+def import_jsonl(path, progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    读取 path 并在一个事务中覆盖两张表，id、分组和排序原样恢复；任何一块校验失败都会回滚。
+    返回 {table_name: 导入行数}。
+    """
+    with _open_jsonl(path, "rb") as f:
+        return database.replace_all_rows_stream(iter_jsonl_rows(f, progress), chunk_size)
+
+def merge_jsonl(path, remove_missing=False, progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """与 merge_markdown 相同的合并导入，只取文件中的非分组条目的文本"""
+    with _open_jsonl(path, "rb") as f:
+        entries = ((table_name, text) for table_name, _, text, _, is_group, _ in iter_jsonl_rows(f, progress) if not is_group)
+        return database.merge_items_stream(entries, remove_missing, chunk_size)
+
+def is_jsonl(path):
+    return path.endswith((".jsonl", ".jsonl.gz"))
@@ -0,0 +1,83 @@
+# diagnostics.py
+"""隐藏的诊断面板（主窗口 Ctrl+Shift+D）：展示 perf 记录的各项操作耗时分位数、行数与慢查询"""
+from datetime import datetime
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QCheckBox, QLabel,
+    QTableWidget, QTableWidgetItem, QHeaderView, QPlainTextEdit, QFileDialog, QMessageBox
+)
+from PySide6.QtCore import Qt, QTimer
+
+import perf
+
+REFRESH_INTERVAL = 1000  # 面板可见时的自动刷新间隔（毫秒）
+
+class DiagnosticsDialog(QDialog):
+    COLUMNS = ("操作", "次数", "p50 (ms)", "p95 (ms)", "最大 (ms)", "总计 (ms)", "行数")
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("性能诊断")
+        self.setMinimumSize(900, 500)
+        layout = QVBoxLayout(self)
+        top_layout = QHBoxLayout()
+        self.enable_checkbox = QCheckBox("启用计时")
+        self.enable_checkbox.setChecked(perf.enabled())
+        self.clear_btn = QPushButton("清空")
+        self.export_json_btn = QPushButton("导出 JSON")
+        self.export_csv_btn = QPushButton("导出 CSV")
+        top_layout.addWidget(self.enable_checkbox)
+        top_layout.addWidget(QLabel(f"慢查询阈值: {perf.slow_query_ms:g} ms"))
+        top_layout.addStretch()
+        top_layout.addWidget(self.clear_btn)
+        top_layout.addWidget(self.export_json_btn)
+        top_layout.addWidget(self.export_csv_btn)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.slow_query_view = QPlainTextEdit()
+        self.slow_query_view.setReadOnly(True)
+        self.slow_query_view.setMaximumHeight(140)
+        layout.addLayout(top_layout)
+        layout.addWidget(self.table)
+        layout.addWidget(QLabel("最近的慢查询:"))
+        layout.addWidget(self.slow_query_view)
+        self.enable_checkbox.toggled.connect(perf.enable)
+        self.clear_btn.clicked.connect(self.clear_stats)
+        self.export_json_btn.clicked.connect(lambda: self.export("json"))
+        self.export_csv_btn.clicked.connect(lambda: self.export("csv"))
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(REFRESH_INTERVAL)
+        self.refresh_timer.timeout.connect(self.refresh)
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refresh_timer.start()
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+    def refresh(self):
+        entries = perf.summary()
+        self.table.setRowCount(len(entries))
+        for row, entry in enumerate(entries):
+            values = (entry["name"], entry["count"], entry["p50_ms"], entry["p95_ms"], entry["max_ms"], entry["total_ms"], entry["rows"])
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(f"{value:.2f}" if isinstance(value, float) else str(value))
+                if column: item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+        self.slow_query_view.setPlainText("\n".join(
+            f"{timestamp}  {elapsed_ms:8.1f} ms  {sql}" for timestamp, elapsed_ms, sql in reversed(perf.slow_queries)))
+    def clear_stats(self):
+        perf.reset()
+        self.refresh()
+    def export(self, kind):
+        file_name = f"QuickKV性能-{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.{kind}"
+        file_filter = "JSON Files (*.json)" if kind == "json" else "CSV Files (*.csv)"
+        path, _ = QFileDialog.getSaveFileName(self, "导出性能数据", file_name, file_filter)
+        if not path: return
+        try:
+            (perf.export_json if kind == "json" else perf.export_csv)(path)
+        except OSError as e:
+            QMessageBox.critical(self, "错误", f"导出失败: {e}")
+            return
+        QMessageBox.information(self, "成功", f"性能数据已导出到:\n{path}")
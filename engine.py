@@ -0,0 +1,111 @@
+# engine.py
+"""与 GUI 无关的输出引擎：把 PRIMARY / SECONDARY 行组装成 “键 值1<分隔符>值2...” 文本
+
+用法: python engine.py [--db 数据库文件] (--layout 组合名 | [TSV 文件，缺省或 - 为标准输入])
+
+TSV 每行三列：PRIMARY<TAB>键<TAB>值 或 SECONDARY<TAB>分隔符<TAB>值，与 InputRow.get_data() 的顺序一致。
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+import database
+import vocabularies
+
+# 一个键组：values 比 separators 多一个，separators[i] 位于 values[i] 与 values[i + 1] 之间
+Group = namedtuple("Group", "key values separators")
+
+def iter_groups(rows):
+    """
+    rows: [(row_type, 键或分隔符, 值), ...]。键和值都非空的 PRIMARY 行开启一个键组，
+    其后值非空的 SECONDARY 行并入该组；键或值为空的 PRIMARY 行会让后续 SECONDARY 行一并被忽略。
+    """
+    current = None
+    for row_type, data1, data2 in rows:
+        if row_type == "PRIMARY":
+            if current is not None:
+                yield current
+            current = Group(data1, [data2], []) if data1 and data2 else None
+        elif row_type == "SECONDARY" and current is not None and data2:
+            current.values.append(data2)
+            current.separators.append(data1)
+    if current is not None:
+        yield current
+
+def format_group(group):
+    parts = [group.key, " ", group.values[0]]
+    for separator, value in zip(group.separators, group.values[1:]):
+        parts.append(separator)
+        parts.append(value)
+    return "".join(parts)
+
+def format_rows(rows):
+    """每个键组一行输出"""
+    return [format_group(group) for group in iter_groups(rows)]
+
+def layout_rows(name):
+    """数据库中保存的组合，转换成 format_rows 接受的行（与界面上一样去掉键和值两端的空白）"""
+    return [
+        ("PRIMARY", row.key.strip(), row.value.strip()) if row.row_type == "PRIMARY"
+        else ("SECONDARY", row.separator, row.value.strip())
+        for row in database.get_layout_rows(name)
+    ]
+
+def has_layouts(path):
+    """以只读方式检查数据库中是否已有组合表（v9 之前的数据库没有），不改动文件，也不切换日志模式"""
+    conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'layouts'").fetchone() is not None
+    finally:
+        conn.close()
+
+def parse_tsv(lines):
+    """逐行解析 TSV，空行和 # 开头的注释行跳过；列数不足三列时以空串补齐"""
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line or line.startswith("#"):
+            continue
+        row_type, _, rest = line.partition("\t")
+        data1, _, data2 = rest.partition("\t")
+        row_type = row_type.strip().upper()
+        if row_type == "PRIMARY":
+            yield row_type, data1.strip(), data2.strip()
+        else:
+            yield row_type, data1, data2.strip()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="不启动界面，渲染组合或 TSV 行的输出文本")
+    parser.add_argument("source", nargs="?", default="-", help="TSV 文件，缺省或 - 表示标准输入")
+    parser.add_argument("--layout", help="渲染数据库中保存的组合")
+    parser.add_argument("--db", help="数据库文件，缺省为当前词库")
+    args = parser.parse_args(argv)
+    if args.layout is not None:
+        db_file = args.db or vocabularies.current_path()
+        if not os.path.exists(db_file):
+            parser.error(f"数据库不存在: {db_file}")
+        try:
+            layouts_ready = has_layouts(db_file)
+        except sqlite3.DatabaseError as e:
+            parser.error(f"无法读取数据库 {db_file}: {e}")
+        if not layouts_ready:
+            parser.error(f"数据库 {db_file} 版本过旧，还没有组合表；请先用主程序打开一次以完成升级")
+        database.DB_FILE = db_file
+        if args.layout not in database.get_layouts():
+            parser.error(f"组合不存在: {args.layout}")
+        rows = layout_rows(args.layout)
+        database.close_db()
+    elif args.source == "-":
+        rows = list(parse_tsv(sys.stdin))
+    else:
+        with open(args.source, encoding="utf-8") as f:
+            rows = list(parse_tsv(f))
+    output = format_rows(rows)
+    if output:
+        sys.stdout.write("\n".join(output) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
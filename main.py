@@ -1,33 +1,99 @@
 # main.py
-import sys
 import os
-import re
-from datetime import datetime
+import sys
+import time
+STARTUP_TIME = time.perf_counter()  # --profile-startup 的计时起点
 from collections import deque
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLineEdit, QPushButton, QCompleter, QMessageBox, QScrollArea,
-    QDialog, QListWidget, QInputDialog, QListWidgetItem, QComboBox,
-    QMenu, QLabel, QAbstractItemView, QFileDialog,
-    QSpacerItem, QSizePolicy
+    QInputDialog, QComboBox, QMenu, QLabel, QSpacerItem, QSizePolicy, QFileDialog
 )
-from PySide6.QtCore import Qt, Signal, QSettings, QSize, QStringListModel, QTimer
-from PySide6.QtGui import QAction, QIcon
+from PySide6.QtCore import Qt, Signal, QObject, QEvent, QSettings, QStringListModel, QTimer
+from PySide6.QtGui import QKeySequence, QShortcut
 
 import database
+import engine
+import perf
+import vocabularies
+from search_index import SearchIndex, DatabaseSearch, AttachedSearch, KeyValueAssociations
+from tasks import DbWorker
+# 数据管理对话框 (management.py) 及其依赖的 data_io、诊断面板 (diagnostics.py) 在首次打开时才导入
+IMPORTED_TIME = time.perf_counter()
+
+SEARCH_LIMIT = 20  # 联想弹窗中展示的候选数
+ROW_POOL_LIMIT = 1000  # 每种行类型最多缓存的空闲 InputRow 数
+
+# <<< SearchCompleter: 候选由 SearchIndex 按输入实时给出排名前 N 的结果 >>>
+class SearchCompleter(QCompleter):
+    def __init__(self, search_index, parent=None, associations=None, key_source=None):
+        super().__init__(parent)
+        self.search_index = search_index
+        # 值联想：associations 给出与 key_source(当前输入框) 返回的键搭配过的值，排在最前
+        self.associations = associations
+        self.key_source = key_source
+        self.results_model = QStringListModel(self)
+        self.setModel(self.results_model)
+        # 候选已由索引过滤并排好序，QCompleter 不再做二次过滤
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+        self.setMaxVisibleItems(SEARCH_LIMIT)
+    def update_completions(self, text):
+        results = []
+        if text and self.associations is not None and self.key_source is not None:
+            results = self.associations.search(self.key_source(self.widget()), text, SEARCH_LIMIT)
+        if text and len(results) < SEARCH_LIMIT:
+            seen = set(results)
+            results += [result for result in self.search_index.search(text, SEARCH_LIMIT) if result not in seen][:SEARCH_LIMIT - len(results)]
+        self.results_model.setStringList(results)
+        if not results: self.popup().hide()
 
-# <<< HistoryLineEdit 和 InputRow 类 (无变化) >>>
+# <<< HistoryStore: 全部输入历史的唯一存放处 >>>
+class HistoryStore(QObject):
+    """启动时一次读入所有历史；修改只在内存中去重，防抖后把有变化的键批量写回 QSettings"""
+    HISTORY_KEYS = ("key_history", "value_history", "separator_history")
+    def __init__(self, settings, maxlen=5, flush_delay=2000, parent=None):
+        super().__init__(parent)
+        self.settings = settings
+        self.maxlen = maxlen
+        self.histories = {key: self._load(key) for key in self.HISTORY_KEYS}
+        self.dirty = set()
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(flush_delay)
+        self.flush_timer.timeout.connect(self.flush)
+    def _load(self, key):
+        return deque(self.settings.value(key, [], type=list), maxlen=self.maxlen)
+    def get(self, key):
+        if key not in self.histories: self.histories[key] = self._load(key)
+        return self.histories[key]
+    def add(self, key, text):
+        if not text: return
+        history = self.get(key)
+        if history and history[0] == text: return
+        if text in history: history.remove(text)
+        history.appendleft(text)
+        self.dirty.add(key)
+        self.flush_timer.start()
+    def flush(self):
+        self.flush_timer.stop()
+        for key in self.dirty:
+            self.settings.setValue(key, list(self.histories[key]))
+        self.dirty.clear()
+
+# <<< HistoryLineEdit 和 InputRow 类 >>>
 class HistoryLineEdit(QLineEdit):
-    def __init__(self, history_key, parent=None):
+    def __init__(self, history_key, history_store, parent=None):
         super().__init__(parent)
-        self.settings = QSettings()
         self.history_key = history_key
-        self.history = deque(self.settings.value(self.history_key, []), maxlen=5)
+        self.history_store = history_store
+        self.history = history_store.get(history_key)
+        self.textEdited.connect(self.on_text_edited)
+    def on_text_edited(self, text):
+        completer = self.completer()
+        if isinstance(completer, SearchCompleter): completer.update_completions(text)
     def add_to_history(self, text):
-        if not text: return
-        if text in self.history: self.history.remove(text)
-        self.history.appendleft(text)
-        self.settings.setValue(self.history_key, list(self.history))
+        self.history_store.add(self.history_key, text)
 
 class InputRow(QWidget):
     delete_requested = Signal(object)
@@ -39,23 +105,22 @@ class InputRow(QWidget):
         self.layout = QHBoxLayout(self)
         self.layout.setContentsMargins(0, 5, 0, 5)
         if self.row_type == "PRIMARY":
-            self.key_input = HistoryLineEdit("key_history")
+            self.key_input = HistoryLineEdit("key_history", self.main_window.history_store)
             self.key_input.setPlaceholderText("输入或选择 键 (Key)")
-            self.key_completer = QCompleter(self.main_window.key_model, self)
-            self.key_input.setCompleter(self.key_completer)
+            # 联想器由主窗口创建，所有行共用；输入框获得焦点时 Qt 会把它挂到该输入框上
+            self.key_input.setCompleter(self.main_window.key_completer)
             self.layout.addWidget(self.key_input)
         else:
             spacer = QSpacerItem(40, 20, QSizePolicy.Fixed, QSizePolicy.Minimum)
             self.layout.addSpacerItem(spacer)
-            self.separator_input = HistoryLineEdit("separator_history")
+            self.separator_input = HistoryLineEdit("separator_history", self.main_window.history_store)
             self.separator_input.setPlaceholderText("符")
             self.separator_input.setFixedWidth(40)
             self.separator_input.setText(",")
             self.layout.addWidget(self.separator_input)
-        self.value_input = HistoryLineEdit("value_history")
+        self.value_input = HistoryLineEdit("value_history", self.main_window.history_store)
         self.value_input.setPlaceholderText("输入或选择 值 (Value)")
-        self.value_completer = QCompleter(self.main_window.value_model, self)
-        self.value_input.setCompleter(self.value_completer)
+        self.value_input.setCompleter(self.main_window.value_completer)
         self.add_btn = QPushButton("+")
         self.add_btn.setFixedSize(24, 24)
         self.delete_btn = QPushButton("X")
@@ -64,234 +129,99 @@ class InputRow(QWidget):
         self.layout.addWidget(self.value_input)
         self.layout.addWidget(self.add_btn)
         self.layout.addWidget(self.delete_btn)
-        for completer in [getattr(self, 'key_completer', None), self.value_completer]:
-            if completer:
-                completer.setCaseSensitivity(Qt.CaseInsensitive)
-                completer.setFilterMode(Qt.MatchContains)
-                completer.setMaxVisibleItems(20)
         if self.row_type == "PRIMARY":
             self.key_input.editingFinished.connect(lambda: self.key_input.add_to_history(self.key_input.text()))
         self.value_input.editingFinished.connect(lambda: self.value_input.add_to_history(self.value_input.text()))
         self.add_btn.clicked.connect(lambda: self.add_new_value_row.emit(self))
         self.delete_btn.clicked.connect(lambda: self.delete_requested.emit(self))
+    def set_contents(self, key="", value="", separator=","):
+        """填入一行的内容；从对象池取回的行也用它重置"""
+        if self.row_type == "PRIMARY":
+            self.key_input.setText(key)
+        else:
+            self.separator_input.setText(separator)
+        self.value_input.setText(value)
     def get_data(self):
         if hasattr(self, 'key_input'):
             return ("PRIMARY", self.key_input.text().strip(), self.value_input.text().strip())
         else:
             return ("SECONDARY", self.separator_input.text(), self.value_input.text().strip())
-
-# <<< DataManagerWidget (回归到 QListWidget) >>>
-class DataManagerWidget(QWidget):
-    data_changed = Signal()
-    def __init__(self, title, table_name, parent=None):
-        super().__init__(parent)
-        self.table_name = table_name
-        self.settings = QSettings()
-        layout = QVBoxLayout(self)
-        top_layout = QHBoxLayout()
-        self.search_box = QLineEdit(placeholderText=f"搜索{title}...")
-        self.sort_btn = QPushButton("排序")
-        self.sort_menu = QMenu()
-        self.sort_btn.setMenu(self.sort_menu)
-        top_layout.addWidget(self.search_box)
-        top_layout.addWidget(self.sort_btn)
-        
-        self.list_widget = QListWidget()
-        self.list_widget.setDragDropMode(QAbstractItemView.InternalMove)
-        self.list_widget.setToolTip("双击编辑，右键删除，拖动排序")
-        
-        layout.addLayout(top_layout)
-        layout.addWidget(self.list_widget)
-        
-        self.setup_sort_menu()
-        self.connect_signals()
-        self.populate_list()
-
-    def setup_sort_menu(self):
-        self.sort_menu.addAction("手动排序", lambda: self.set_sort_order("sort_order"))
-        self.sort_menu.addAction("按字母升序", lambda: self.set_sort_order("alpha_asc"))
-        self.sort_menu.addAction("按字母降序", lambda: self.set_sort_order("alpha_desc"))
-
-    def set_sort_order(self, order):
-        self.settings.setValue(f"sort_order/{self.table_name}", order)
-        self.settings.sync()
-        self.populate_list()
-
-    def connect_signals(self):
-        self.list_widget.itemDoubleClicked.connect(self.edit_item)
-        self.search_box.textChanged.connect(self.filter_list)
-        self.list_widget.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.list_widget.customContextMenuRequested.connect(self.show_context_menu)
-        self.list_widget.model().rowsMoved.connect(self.on_rows_moved)
-
-    def on_rows_moved(self, parent, start, end, destination, row):
-        if self.settings.value(f"sort_order/{self.table_name}", "sort_order") == "sort_order":
-            QTimer.singleShot(0, self.update_db_sort_order)
-
-    def populate_list(self):
-        order = self.settings.value(f"sort_order/{self.table_name}", "sort_order")
-        self.list_widget.setDragEnabled(order == "sort_order")
-        
-        self.list_widget.clear()
-        for item_id, item_text, _, is_group, _ in database.get_all_items(self.table_name, order):
-            if not is_group:
-                item = QListWidgetItem(item_text)
-                item.setData(Qt.UserRole, item_id)
-                self.list_widget.addItem(item)
-
-    def update_db_sort_order(self):
-        id_order = [self.list_widget.item(i).data(Qt.UserRole) for i in range(self.list_widget.count())]
-        database.update_sort_order(self.table_name, id_order)
-        self.data_changed.emit()
-
-    def filter_list(self, text):
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            item.setHidden(text.lower() not in item.text().lower())
-
-    def show_context_menu(self, pos):
-        menu = QMenu()
-        add_item_action = menu.addAction("添加新项...")
-        item = self.list_widget.itemAt(pos)
-        if item:
-            menu.addSeparator()
-            delete_action = menu.addAction("删除该项")
+    def get_layout_row(self):
+        """保存组合用的原样内容，SECONDARY 行的分隔符单独成列"""
+        if hasattr(self, 'key_input'):
+            return database.LayoutRow("PRIMARY", self.key_input.text(), "", self.value_input.text())
         else:
-            delete_action = None
-        action = menu.exec(self.list_widget.mapToGlobal(pos))
-        if action == add_item_action: self.add_item()
-        elif action == delete_action and item: self.delete_item(item)
-
-    def add_item(self):
-        text, ok = QInputDialog.getText(self, "添加新项", "请输入内容:")
-        if ok and text:
-            success, msg = database.add_item(self.table_name, text)
-            if success:
-                self.populate_list()
-                self.data_changed.emit()
-            else:
-                QMessageBox.warning(self, "错误", msg)
-
-    def edit_item(self, item):
-        item_id = item.data(Qt.UserRole)
-        old_text = item.text()
-        new_text, ok = QInputDialog.getText(self, "编辑项", "请输入新内容:", text=old_text)
-        if ok and new_text and new_text != old_text:
-            success, msg = database.update_item_text(self.table_name, item_id, new_text)
-            if success:
-                item.setText(new_text)
-                self.data_changed.emit()
-            else:
-                QMessageBox.warning(self, "错误", msg)
-
-    def delete_item(self, item):
-        item_id = item.data(Qt.UserRole)
-        if QMessageBox.question(self, "确认删除", f"确定要删除 '{item.text()}' 吗？", QMessageBox.Yes | QMessageBox.No, QMessageBox.No) == QMessageBox.Yes:
-            # 注意：这里不再是递归删除
-            success, msg = database.delete_item(self.table_name, item_id)
-            if success:
-                self.populate_list()
-                self.data_changed.emit()
-            else:
-                QMessageBox.warning(self, "错误", msg)
+            return database.LayoutRow("SECONDARY", "", self.separator_input.text(), self.value_input.text())
 
-class ManagementDialog(QDialog):
-    data_changed = Signal()
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("数据管理")
-        self.setMinimumSize(700, 500)
-        main_layout = QVBoxLayout(self)
-        data_layout = QHBoxLayout()
-        self.keys_manager = DataManagerWidget("键", "keys")
-        self.values_manager = DataManagerWidget("值", "value_items")
-        data_layout.addWidget(self.keys_manager)
-        data_layout.addWidget(self.values_manager)
-        io_layout = QHBoxLayout()
-        self.export_btn = QPushButton("导出为md")
-        self.import_btn = QPushButton("导入为md")
-        io_layout.addStretch()
-        io_layout.addWidget(self.export_btn)
-        io_layout.addWidget(self.import_btn)
-        io_layout.addStretch()
-        main_layout.addLayout(data_layout)
-        main_layout.addLayout(io_layout)
-        self.keys_manager.data_changed.connect(self.data_changed.emit)
-        self.values_manager.data_changed.connect(self.data_changed.emit)
-        self.export_btn.clicked.connect(self.export_to_md)
-        self.import_btn.clicked.connect(self.import_from_md)
-    def export_to_md(self):
-        file_name = f"QuickKV导出-{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.md"
-        path, _ = QFileDialog.getSaveFileName(self, "导出为 Markdown", file_name, "Markdown Files (*.md)")
-        if not path: return
-        content = f"# QuickKV 数据导出 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-        for title, manager in [("键 (Keys)", self.keys_manager), ("值 (Values)", self.values_manager)]:
-            content += f"## --- {title} ---\n\n"
-            for i in range(manager.list_widget.count()):
-                item = manager.list_widget.item(i)
-                content += f"- {item.text()}\n"
-            content += "\n"
-        try:
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            QMessageBox.information(self, "成功", f"数据已成功导出到:\n{path}")
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"导出文件失败: {e}")
-    def import_from_md(self):
-        path, _ = QFileDialog.getOpenFileName(self, "导入 Markdown 文件", "", "Markdown Files (*.md)")
-        if not path: return
-        reply = QMessageBox.question(self, "确认导入", "此操作将完全覆盖当前所有的键和值，且不可撤销。\n是否继续？", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-        if reply != QMessageBox.Yes: return
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            keys_data, values_data = self.parse_md_content(lines)
-            database.replace_all_items("keys", keys_data)
-            database.replace_all_items("value_items", values_data)
-            self.keys_manager.populate_list()
-            self.values_manager.populate_list()
-            self.data_changed.emit()
-            QMessageBox.information(self, "成功", "数据导入成功！")
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"导入文件失败: {e}")
-    def parse_md_content(self, lines):
-        keys_data, values_data = [], []
-        current_list = None
-        for line in lines:
-            if line.startswith("## --- 键"):
-                current_list = keys_data
-                continue
-            elif line.startswith("## --- 值"):
-                current_list = values_data
-                continue
-            if current_list is None or not line.strip().startswith('-'):
-                continue
-            text = line.strip()[1:].strip()
-            if text:
-                current_list.append((text, 0, 0, len(current_list)))
-        return keys_data, values_data
+def build_search_indexes(progress, table_names):
+    """后台任务：为 table_names 各建一个 SearchIndex"""
+    indexes = {}
+    with perf.measure("build_search_indexes") as m:
+        row_count = 0
+        for i, table_name in enumerate(table_names):
+            index = SearchIndex()
+            index.set_usage(database.get_usage(table_name))
+            items = database.get_all_items(table_name)
+            index.reset_items(items)
+            row_count += len(items)
+            indexes[table_name] = index
+            progress(i + 1, len(table_names))
+        m.rows = row_count
+    return indexes
 
 # <<< 主窗口 (与上一版完全相同，此处省略) >>>
 class MainWindow(QMainWindow):
+    # database 的变更可能在任意线程提交，经由信号排队回到 GUI 线程
+    items_changed = Signal(object)
+    # 组合已加载且搜索索引已就绪
+    ready = Signal()
     def __init__(self):
         super().__init__()
         QApplication.setOrganizationName("MyCompany")
         QApplication.setApplicationName("QuickKV")
         self.settings = QSettings()
+        self.history_store = HistoryStore(self.settings, parent=self)
         self.management_dialog = None
         self.setWindowTitle("QuickKV")
-        self.key_model = QStringListModel(self)
-        self.value_model = QStringListModel(self)
+        # 全局搜索索引，为所有 InputRow 的联想和数据管理中的搜索提供数据
+        if self.settings.value("search_backend", "memory") == "fts" and database.fts_available():
+            self.key_index = DatabaseSearch("keys")
+            self.value_index = DatabaseSearch("value_items")
+        else:
+            self.key_index = SearchIndex()
+            self.value_index = SearchIndex()
+        self.value_associations = KeyValueAssociations()
+        # 联想同时查询参与联合搜索的其他词库；数据管理只针对当前词库
+        self.key_completer = SearchCompleter(AttachedSearch(self.key_index, "keys"), self)
+        self.value_completer = SearchCompleter(AttachedSearch(self.value_index, "value_items"), self, self.value_associations,
+                                               lambda line_edit: self.row_key(line_edit.parentWidget()))
+        # 切换组合时移出的行放回池中复用，不再销毁重建
+        self.row_pool = {"PRIMARY": [], "SECONDARY": []}
+        self.index_version = None
+        self.reload_task = None
+        # 导入/导出和整表读取都在这个后台线程中串行执行
+        self.db_worker = DbWorker(self)
+        self.db_worker.start()
+        self.items_changed.connect(self.on_items_changed)
+        self.change_listener = self.items_changed.emit
+        database.add_change_listener(self.change_listener)
         self.current_layout_name = ""
+        # 已提交但工作线程尚未写入的组合行，写完之前切回该组合时从这里取
+        self.unsaved_layout_rows = {}
         main_widget = QWidget()
         self.setCentralWidget(main_widget)
         self.main_layout = QVBoxLayout(main_widget)
         top_bar_layout = QHBoxLayout()
+        self.vocabulary_combo = QComboBox()
+        self.vocabulary_btn = QPushButton("管理词库")
         self.layout_combo = QComboBox()
         self.layout_manage_btn = QPushButton("管理组合")
         self.confirm_button = QPushButton("确定 (复制)")
         self.manage_button = QPushButton("管理数据")
         self.add_group_button = QPushButton("添加新键组 (+)")
+        top_bar_layout.addWidget(QLabel("词库:"))
+        top_bar_layout.addWidget(self.vocabulary_combo)
+        top_bar_layout.addWidget(self.vocabulary_btn)
         top_bar_layout.addWidget(QLabel("组合:"))
         top_bar_layout.addWidget(self.layout_combo)
         top_bar_layout.addWidget(self.layout_manage_btn)
@@ -312,12 +242,90 @@ class MainWindow(QMainWindow):
         self.manage_button.clicked.connect(self.open_management_dialog)
         self.layout_combo.currentIndexChanged.connect(self.on_layout_switch)
         self.layout_manage_btn.clicked.connect(self.manage_layouts)
-        self.on_data_changed()
-        self.load_layouts()
+        self.vocabulary_combo.currentIndexChanged.connect(self.on_vocabulary_switch)
+        self.vocabulary_btn.clicked.connect(self.manage_vocabularies)
+        self.load_vocabularies()
+        # 隐藏的诊断面板
+        self.diagnostics_dialog = None
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.open_diagnostics_dialog)
+        self.layouts_loaded = False
+        self.is_ready = False
         self.load_window_settings()
+        # 先让窗口显示出来，组合与搜索索引在事件循环开始后再加载
+        QTimer.singleShot(0, self.load_initial_data)
+    def load_initial_data(self):
+        # 旧版组合的迁移排在建索引之前，迁移完成后再加载组合
+        migrating = self.migrate_layouts_from_settings()
+        self.on_data_changed()  # 索引在后台线程中构建
+        if not migrating: self.load_layouts()
+    def check_ready(self):
+        if self.is_ready or not self.layouts_loaded or self.index_version is None: return
+        self.is_ready = True
+        self.ready.emit()
+    @perf.timed("MainWindow.on_data_changed")
     def on_data_changed(self):
-        self.key_model.setStringList([k[1] for k in database.get_all_items("keys")])
-        self.value_model.setStringList([v[1] for v in database.get_all_items("value_items")])
+        # 数据版本未变（例如只切换了排序方式）时无需重建搜索索引
+        version = database.data_version()
+        if version == self.index_version or self.reload_task is not None: return
+        self.rebuild_indexes(("keys", "value_items"), version)
+    def rebuild_indexes(self, table_names, version):
+        # 数据库搜索模式下不需要把整张表读进内存
+        table_names = [name for name in table_names if isinstance(self.key_index if name == "keys" else self.value_index, SearchIndex)]
+        if not table_names:
+            self.index_version = version
+            return
+        # 整表读取和建索引放到后台线程，完成后在 GUI 线程中一次性换上
+        self.reload_task = self.db_worker.submit(build_search_indexes, table_names)
+        self.reload_task.finished.connect(lambda indexes: self.on_indexes_loaded(version, indexes), Qt.QueuedConnection)
+        self.reload_task.failed.connect(lambda message: self.on_indexes_failed(version, message), Qt.QueuedConnection)
+    def on_indexes_loaded(self, version, indexes):
+        self.reload_task = None
+        for table_name, index in indexes.items():
+            (self.key_index if table_name == "keys" else self.value_index).replace_with(index)
+        self.index_version = version
+        self.check_ready()
+        # 加载期间如果又有提交，再追一次
+        self.on_data_changed()
+    def on_indexes_failed(self, version, message):
+        self.reload_task = None
+        print(f"加载搜索索引失败: {message}")
+        # 构建期间到达的变更都被跳过了；数据版本已经前进（例如切换了数据库）时重建一次，
+        # 否则索引会一直停在旧数据上。版本未变说明失败与变更无关，不重试以免反复失败
+        if database.data_version() != version:
+            self.on_data_changed()
+    @perf.timed("MainWindow.on_items_changed")
+    def on_items_changed(self, change_set):
+        # 键值搭配缓存与搜索索引的版本无关，直接按事件失效
+        for change in change_set.changes:
+            if change.kind == "reset": self.value_associations.invalidate()
+            elif change.kind == "paired": self.value_associations.invalidate(change.text)
+            # 只给出仍在值表中的值：值的增删改可能影响任何键的搭配
+            elif change.table == "value_items" and change.kind in ("inserted", "updated", "removed"): self.value_associations.invalidate()
+        # 后台重建进行中时由重建完成后的版本检查统一追平
+        if self.reload_task is not None or self.index_version is None: return
+        reset_tables = {c.table for c in change_set.changes if c.kind == "reset"}
+        if change_set.version > self.index_version:
+            if change_set.version != self.index_version + 1 or None in reset_tables:
+                # 中间漏掉了版本，或者所有表都变了：退回整体重建
+                self.on_data_changed()
+                return
+            self.index_version = change_set.version
+        elif any(c.kind not in database.USAGE_KINDS for c in change_set.changes):
+            # 已包含在当前索引中的旧提交；只记录使用次数的提交不推进版本，照常更新排名
+            return
+        used = {}
+        for change in change_set.changes:
+            # 整表变化的表稍后重建；moved 只改了位置，索引中的文本不变
+            if change.table in reset_tables: continue
+            index = self.key_index if change.table == "keys" else self.value_index
+            if change.kind == "inserted" and not change.is_group: index.insert_item(change.item_id, change.text)
+            elif change.kind == "updated": index.update_item(change.item_id, change.text)
+            elif change.kind == "removed": index.remove_item(change.item_id)
+            elif change.kind == "used": used.setdefault(change.table, []).append(change.text)
+        for table_name, texts in used.items():
+            index = self.key_index if table_name == "keys" else self.value_index
+            index.set_usage(database.get_usage(table_name, texts))
+        if reset_tables: self.rebuild_indexes(sorted(reset_tables), change_set.version)
     def on_layout_switch(self, index):
         if index == -1 or self.layout_combo.signalsBlocked(): return
         new_layout_name = self.layout_combo.currentText()
@@ -328,8 +336,7 @@ class MainWindow(QMainWindow):
         self.load_layout_rows()
     def manage_layouts(self):
         self.save_current_layout_rows()
-        self.settings.sync()
-        layouts = self.settings.value("layouts", ["默认组合"])
+        layouts = database.get_layouts()
         current_name = self.layout_combo.currentText()
         menu = QMenu()
         add_action = menu.addAction("添加新组合...")
@@ -341,49 +348,160 @@ class MainWindow(QMainWindow):
         if action == add_action:
             text, ok = QInputDialog.getText(self, "添加新组合", "请输入新组合名称:")
             if ok and text and text not in layouts:
-                layouts.append(text)
-                self.settings.setValue("layouts", layouts)
-                self.load_layouts(new_layout_to_select=text)
+                self.submit_layout_write(text, database.add_layout, text)
         elif action == rename_action:
             if current_name == "默认组合":
                 QMessageBox.information(self, "提示", "无法重命名“默认组合”。")
                 return
             new_name, ok = QInputDialog.getText(self, "重命名组合", "请输入新的组合名称:", text=current_name)
             if ok and new_name and new_name != current_name and new_name not in layouts:
-                layouts[layouts.index(current_name)] = new_name
-                self.settings.setValue("layouts", layouts)
-                self.settings.setValue(f"layout_rows/{new_name}", self.settings.value(f"layout_rows/{current_name}"))
-                self.settings.remove(f"layout_rows/{current_name}")
-                self.load_layouts(new_layout_to_select=new_name)
+                # 行随组合改名；写入按提交顺序执行，之后按新名保存的行排在改名之后
+                self.current_layout_name = new_name
+                self.submit_layout_write(new_name, database.rename_layout, current_name, new_name)
         elif action == delete_action:
             if QMessageBox.question(self, "确认删除", f"确定要删除组合 '{current_name}' 吗？", QMessageBox.Yes | QMessageBox.No, QMessageBox.No) == QMessageBox.Yes:
-                layouts.remove(current_name)
-                self.settings.setValue("layouts", layouts)
-                self.settings.remove(f"layout_rows/{current_name}")
-                self.load_layouts()
-        self.settings.sync()
+                self.unsaved_layout_rows.pop(current_name, None)
+                self.current_layout_name = ""
+                self.submit_layout_write(None, database.delete_layout, current_name)
+    def submit_layout_write(self, name_to_select, func, *args):
+        """组合的增删改在工作线程中执行，完成前禁用组合切换，完成后重新加载组合列表"""
+        self.layout_combo.setEnabled(False)
+        self.layout_manage_btn.setEnabled(False)
+        task = self.db_worker.submit_write(func, *args)
+        task.finished.connect(lambda result: self.on_layout_written(result, name_to_select))
+        task.failed.connect(lambda message: self.on_layout_written((False, message), name_to_select))
+    def on_layout_written(self, result, name_to_select):
+        self.layout_combo.setEnabled(True)
+        self.layout_manage_btn.setEnabled(True)
+        success, msg = result
+        if not success:
+            QMessageBox.warning(self, "错误", f"组合操作失败: {msg}")
+            # 回到操作前的组合，重新从库中加载它的行
+            name_to_select = self.layout_combo.currentText()
+            self.current_layout_name = ""
+        self.load_layouts(new_layout_to_select=name_to_select)
+    def load_vocabularies(self):
+        self.vocabulary_combo.blockSignals(True)
+        self.vocabulary_combo.clear()
+        for vocabulary in vocabularies.list_vocabularies():
+            self.vocabulary_combo.addItem(vocabulary.name)
+            self.vocabulary_combo.setItemData(self.vocabulary_combo.count() - 1, vocabulary.path, Qt.ToolTipRole)
+        self.vocabulary_combo.setCurrentIndex(max(0, self.vocabulary_combo.findText(vocabularies.current_name())))
+        self.vocabulary_combo.blockSignals(False)
+    def on_vocabulary_switch(self, index):
+        name = self.vocabulary_combo.itemText(index)
+        if index == -1 or name == vocabularies.current_name(): return
+        if self.reload_task is not None:
+            # 切换会关闭旧数据库的连接，后台正在用它建索引
+            QMessageBox.information(self, "提示", "搜索索引正在加载，请稍后再切换词库。")
+            self.load_vocabularies()
+            return
+        if self.management_dialog is not None and self.management_dialog.isVisible():
+            if self.management_dialog.current_task is not None:
+                QMessageBox.information(self, "提示", "数据管理中的任务尚未完成，请稍后再切换词库。")
+                self.load_vocabularies()
+                return
+            self.management_dialog.close()
+        # 组合保存在各自的词库中：先写回旧词库，切换后重新加载
+        self.save_current_layout_rows()
+        self.vocabulary_combo.setEnabled(False)
+        self.switch_vocabulary(name)
+    def switch_vocabulary(self, name):
+        # 切换会关闭旧数据库的连接：等工作线程执行完排队的写入（包括上面的保存）再切
+        if not self.db_worker.is_idle():
+            QTimer.singleShot(50, lambda: self.switch_vocabulary(name))
+            return
+        self.vocabulary_combo.setEnabled(True)
+        success, msg = vocabularies.switch_to(name)
+        if not success:
+            QMessageBox.warning(self, "错误", msg)
+            self.load_vocabularies()
+            return
+        # 切换本身会广播 reset 变更，搜索索引随之在后台重建
+        self.current_layout_name = ""
+        self.unsaved_layout_rows.clear()
+        self.load_layouts()
+    def manage_vocabularies(self):
+        current = vocabularies.current_name()
+        others = [vocabulary for vocabulary in vocabularies.list_vocabularies() if vocabulary.name != current]
+        menu = QMenu()
+        new_action = menu.addAction("新建词库...")
+        open_action = menu.addAction("添加已有词库文件...")
+        rename_action = menu.addAction("重命名当前词库...")
+        search_menu = menu.addMenu("联合搜索")
+        remove_menu = menu.addMenu("从列表中移除")
+        search_menu.setToolTip("勾选的词库会与当前词库一起提供联想")
+        search_menu.setToolTipsVisible(True)
+        for vocabulary in others:
+            action = search_menu.addAction(vocabulary.name)
+            action.setCheckable(True)
+            action.setChecked(vocabulary.search)
+            action.toggled.connect(lambda checked, name=vocabulary.name: vocabularies.set_search(name, checked))
+            remove_menu.addAction(vocabulary.name, lambda name=vocabulary.name: self.remove_vocabulary(name))
+        search_menu.setEnabled(bool(others))
+        remove_menu.setEnabled(bool(others))
+        action = menu.exec(self.vocabulary_btn.mapToGlobal(self.vocabulary_btn.rect().bottomLeft()))
+        if action in (new_action, open_action):
+            if action == new_action:
+                path, _ = QFileDialog.getSaveFileName(self, "新建词库", "", "QuickKV 词库 (*.db)")
+            else:
+                path, _ = QFileDialog.getOpenFileName(self, "添加已有词库文件", "", "QuickKV 词库 (*.db)")
+            if not path: return
+            default_name = os.path.splitext(os.path.basename(path))[0]
+            name, ok = QInputDialog.getText(self, "词库名称", "请输入词库名称:", text=default_name)
+            if not ok or not name: return
+            success, msg = vocabularies.add_vocabulary(name, path)
+            if not success:
+                QMessageBox.warning(self, "错误", msg)
+                return
+            self.load_vocabularies()
+            if QMessageBox.question(self, "切换词库", f"现在切换到词库“{name}”吗？", QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
+                self.vocabulary_combo.setCurrentIndex(self.vocabulary_combo.findText(name))
+        elif action == rename_action:
+            new_name, ok = QInputDialog.getText(self, "重命名词库", "请输入新的词库名称:", text=current)
+            if ok and new_name and new_name != current:
+                success, msg = vocabularies.rename_vocabulary(current, new_name)
+                if not success: QMessageBox.warning(self, "错误", msg)
+                self.load_vocabularies()
+    def remove_vocabulary(self, name):
+        if QMessageBox.question(self, "确认移除", f"确定要把词库 '{name}' 从列表中移除吗？（不会删除文件）", QMessageBox.Yes | QMessageBox.No, QMessageBox.No) == QMessageBox.Yes:
+            vocabularies.remove_vocabulary(name)
+            self.load_vocabularies()
     def closeEvent(self, event):
+        database.remove_change_listener(self.change_listener)
+        # 保存排进工作线程；stop() 取消导入等任务，但会执行完排队中的写入
         self.save_current_layout_rows()
+        self.db_worker.stop()
         self.settings.setValue("geometry", self.saveGeometry())
         self.settings.setValue("windowState", self.saveState())
-        self.settings.setValue("current_layout", self.layout_combo.currentText())
+        if self.layouts_loaded: self.settings.setValue("current_layout", self.layout_combo.currentText())
+        self.history_store.flush()
         self.settings.sync()
         super().closeEvent(event)
-    def add_new_row(self, row_type="PRIMARY", key="", value="", separator=",", insert_after_widget=None):
+    def acquire_row(self, row_type):
+        """从对象池取一行，池空时新建（信号只在新建时连接一次）"""
+        pool = self.row_pool[row_type]
+        if pool: return pool.pop()
         row = InputRow(row_type=row_type, main_window=self)
-        if row_type == "PRIMARY":
-            row.key_input.setText(key)
-            row.value_input.setText(value)
-        else:
-            row.separator_input.setText(separator)
-            row.value_input.setText(value)
         row.delete_requested.connect(self.delete_row)
         row.add_new_value_row.connect(self.add_secondary_row)
+        return row
+    def release_row(self, row):
+        """把行移出布局并放回对象池，超出上限的直接销毁"""
+        self.rows_layout.removeWidget(row)
+        row.hide()
+        pool = self.row_pool[row.row_type]
+        if len(pool) < ROW_POOL_LIMIT: pool.append(row)
+        else: row.deleteLater()
+    def add_new_row(self, row_type="PRIMARY", key="", value="", separator=",", insert_after_widget=None):
+        row = self.acquire_row(row_type)
+        row.set_contents(key, value, separator)
         if insert_after_widget:
             index = self.rows_layout.indexOf(insert_after_widget)
             self.rows_layout.insertWidget(index + 1, row)
         else:
             self.rows_layout.insertWidget(self.rows_layout.count() - 2, row)
+        row.show()
     def add_secondary_row(self, sender_widget):
         index = self.rows_layout.indexOf(sender_widget)
         while index + 1 < self.rows_layout.count() - 2:
@@ -393,88 +511,140 @@ class MainWindow(QMainWindow):
             else:
                 break
         self.add_new_row(row_type="SECONDARY", insert_after_widget=self.rows_layout.itemAt(index).widget())
+    def row_key(self, row_widget):
+        """row_widget 所属键组的键：PRIMARY 行取自身，SECONDARY 行取上方最近的 PRIMARY 行"""
+        for i in range(self.rows_layout.indexOf(row_widget), -1, -1):
+            widget = self.rows_layout.itemAt(i).widget()
+            if isinstance(widget, InputRow) and widget.row_type == "PRIMARY":
+                return widget.key_input.text().strip()
+        return ""
     def open_management_dialog(self):
         if self.management_dialog is None or not self.management_dialog.isVisible():
+            from management import ManagementDialog
             self.management_dialog = ManagementDialog(self)
             self.management_dialog.data_changed.connect(self.on_data_changed)
             self.management_dialog.show()
         self.management_dialog.activateWindow()
+    def open_diagnostics_dialog(self):
+        if self.diagnostics_dialog is None:
+            from diagnostics import DiagnosticsDialog
+            self.diagnostics_dialog = DiagnosticsDialog(self)
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.activateWindow()
     def delete_row(self, row_widget):
         if row_widget.row_type == "PRIMARY":
             start_index = self.rows_layout.indexOf(row_widget)
-            row_widget.deleteLater()
+            self.release_row(row_widget)
+            # 主行移出后，其下的 SECONDARY 行依次移到 start_index 处
             while start_index < self.rows_layout.count() - 2:
                 widget = self.rows_layout.itemAt(start_index).widget()
                 if isinstance(widget, InputRow) and widget.row_type == "SECONDARY":
-                    widget.deleteLater()
+                    self.release_row(widget)
                 else:
                     break
         else:
-            row_widget.deleteLater()
+            self.release_row(row_widget)
+    @perf.timed("MainWindow.process_and_copy")
     def process_and_copy(self):
-        output_text = []
-        current_group = None
-        for i in range(self.rows_layout.count()):
-            widget = self.rows_layout.itemAt(i).widget()
-            if not isinstance(widget, InputRow): continue
-            row_type, data1, data2 = widget.get_data()
-            if row_type == "PRIMARY":
-                if current_group and current_group["key"]:
-                    values_str = current_group["values"][0]
-                    for j, val in enumerate(current_group["values"][1:]):
-                        sep = current_group["separators"][j]
-                        values_str += f"{sep}{val}"
-                    output_text.append(f"{current_group['key']} {values_str}")
-                if data1 and data2:
-                    current_group = {"key": data1, "values": [data2], "separators": []}
-                    widget.key_input.add_to_history(data1)
-                    widget.value_input.add_to_history(data2)
-                else:
-                    current_group = None
-            elif row_type == "SECONDARY" and current_group:
-                if data2:
-                    current_group["values"].append(data2)
-                    current_group["separators"].append(data1)
-                    widget.value_input.add_to_history(data2)
-                    widget.separator_input.add_to_history(data1)
-        if current_group and current_group["key"]:
-            values_str = current_group["values"][0]
-            for i, val in enumerate(current_group["values"][1:]):
-                sep = current_group["separators"][i]
-                values_str += f"{sep}{val}"
-            output_text.append(f"{current_group['key']} {values_str}")
-        if not output_text: QMessageBox.information(self, "提示", "没有可复制的内容。"); return
-        QApplication.clipboard().setText("\n".join(output_text))
-        QMessageBox.information(self, "成功", f"内容已复制到剪贴板！")
+        rows = [widget.get_data() for widget in (self.rows_layout.itemAt(i).widget() for i in range(self.rows_layout.count()))
+                if isinstance(widget, InputRow)]
+        groups = list(engine.iter_groups(rows))
+        if not groups: QMessageBox.information(self, "提示", "没有可复制的内容。"); return
+        QApplication.clipboard().setText("\n".join(engine.format_group(group) for group in groups))
+        used = {"keys": [], "value_items": []}
+        pairs = []
+        for group in groups:
+            self.history_store.add("key_history", group.key)
+            used["keys"].append(group.key)
+            for value in group.values:
+                self.history_store.add("value_history", value)
+                used["value_items"].append(value)
+                pairs.append((group.key, value))
+            for separator in group.separators:
+                self.history_store.add("separator_history", separator)
+        # 本次用到的键、值及其搭配一次性写入使用统计，联想结果据此排名；
+        # 写入排进工作线程，后台导入进行中时也不会卡住界面
+        task = self.db_worker.submit_write(database.record_usage, used, pairs)
+        task.failed.connect(lambda message: print(f"记录使用统计失败: {message}"))
+        QMessageBox.information(self, "成功", "内容已复制到剪贴板！")
     def load_layout_rows(self):
-        self.clear_all_rows()
-        rows_data = self.settings.value(f"layout_rows/{self.current_layout_name}", [])
-        if rows_data:
-            for row_data in rows_data:
-                if len(row_data) == 3:
-                    self.add_new_row(row_type=row_data[0], key=row_data[1], value=row_data[2])
-                elif len(row_data) == 4:
-                    self.add_new_row(row_type=row_data[0], separator=row_data[1], value=row_data[2])
-        else:
-            self.add_new_row(row_type="PRIMARY")
+        # 批量增删行期间暂停重绘并隐藏容器：隐藏父控件下的 show()/hide() 只改标志位，重新显示时统一布局一次
+        with perf.measure("MainWindow.load_layout_rows") as m:
+            self.rows_container.setUpdatesEnabled(False)
+            self.rows_container.hide()
+            try:
+                self.clear_all_rows()
+                rows = self.unsaved_layout_rows.get(self.current_layout_name)
+                if rows is None: rows = database.get_layout_rows(self.current_layout_name)
+                if rows:
+                    for row in rows:
+                        self.add_new_row(row_type=row.row_type, key=row.key, value=row.value, separator=row.separator)
+                else:
+                    self.add_new_row(row_type="PRIMARY")
+                m.rows = len(rows)
+            finally:
+                self.rows_container.show()
+                self.rows_container.setUpdatesEnabled(True)
     def save_current_layout_rows(self):
         if not hasattr(self, 'current_layout_name') or not self.current_layout_name: return
-        rows_data = []
+        rows = []
         for i in range(self.rows_layout.count()):
             widget = self.rows_layout.itemAt(i).widget()
             if isinstance(widget, InputRow):
-                rows_data.append(widget.get_data())
-        self.settings.setValue(f"layout_rows/{self.current_layout_name}", rows_data)
+                rows.append(widget.get_layout_row())
+        # 只改写与库中不同的行；写入在工作线程中执行，写完之前切回这个组合时从内存中取
+        name = self.current_layout_name
+        self.unsaved_layout_rows[name] = rows
+        task = self.db_worker.submit_write(database.save_layout_rows, name, rows)
+        task.finished.connect(lambda _: self.on_layout_rows_saved(rows))
+        task.failed.connect(lambda message: print(f"保存组合失败: {message}"))
+    def on_layout_rows_saved(self, rows):
+        # 按对象比较：之后又提交了新的行（或组合已改名）时保留较新的那份
+        for name, pending in list(self.unsaved_layout_rows.items()):
+            if pending is rows: del self.unsaved_layout_rows[name]
+    def migrate_layouts_from_settings(self):
+        """
+        旧版把组合整体序列化在 QSettings 中，首次运行新版时一次性搬进数据库并清除。
+        返回是否提交了迁移，迁移完成后再加载组合。
+        """
+        names = self.settings.value("layouts", [])
+        if not names: return False
+        if isinstance(names, str): names = [names]
+        layouts = []
+        for name in dict.fromkeys(names):
+            rows = []
+            for row_data in self.settings.value(f"layout_rows/{name}", []) or []:
+                if len(row_data) < 3: continue
+                if row_data[0] == "PRIMARY":
+                    rows.append(database.LayoutRow("PRIMARY", row_data[1], "", row_data[2]))
+                else:
+                    rows.append(database.LayoutRow("SECONDARY", "", row_data[1], row_data[2]))
+            layouts.append((name, rows))
+        task = self.db_worker.submit_write(database.import_layouts, layouts)
+        task.finished.connect(self.on_layouts_migrated)
+        task.failed.connect(lambda message: print(f"迁移旧版组合失败: {message}"))
+        task.failed.connect(lambda message: self.load_layouts())
+        return True
+    def on_layouts_migrated(self, imported):
+        # 导入没有发生（库中已有组合）时保留 QSettings 中的旧数据，那是它们仅有的一份
+        if imported:
+            self.settings.remove("layouts")
+            self.settings.remove("layout_rows")
+        else:
+            print("数据库中已有组合，旧版组合仍保留在 QSettings 中。")
+        self.load_layouts()
     def load_window_settings(self):
         self.restoreGeometry(self.settings.value("geometry", self.saveGeometry()))
         self.restoreState(self.settings.value("windowState", self.saveState()))
     def load_layouts(self, new_layout_to_select=None):
         self.layout_combo.blockSignals(True)
         self.layout_combo.clear()
-        layouts = self.settings.value("layouts", ["默认组合"])
-        if not layouts: layouts = ["默认组合"]
-        if "默认组合" not in layouts: layouts.insert(0, "默认组合")
-        self.settings.setValue("layouts", list(dict.fromkeys(layouts)))
+        layouts = database.get_layouts()
+        if "默认组合" not in layouts:
+            # 在工作线程中创建；之后对它的保存排在创建之后
+            task = self.db_worker.submit_write(database.add_layout, "默认组合", True)
+            task.failed.connect(lambda message: print(f"创建默认组合失败: {message}"))
+            layouts.insert(0, "默认组合")
         self.layout_combo.addItems(layouts)
         name_to_select = new_layout_to_select or self.settings.value("current_layout", "默认组合")
         # <<< BUGFIX: 修正此处的错误 >>>
@@ -483,15 +653,44 @@ class MainWindow(QMainWindow):
         self.layout_combo.setCurrentIndex(index)
         self.layout_combo.blockSignals(False)
         self.on_layout_switch(index)
+        self.layouts_loaded = True
+        self.check_ready()
     def clear_all_rows(self):
-        while self.rows_layout.count() > 2:
-            item = self.rows_layout.itemAt(0)
-            if item and item.widget(): item.widget().deleteLater()
-            self.rows_layout.takeAt(0)
+        # 从末尾往前移出，避免每次移出都让后面的项前移
+        for i in range(self.rows_layout.count() - 3, -1, -1):
+            widget = self.rows_layout.itemAt(i).widget()
+            if isinstance(widget, InputRow): self.release_row(widget)
+            else: self.rows_layout.takeAt(i)
+
+class StartupProfiler(QObject):
+    """--profile-startup：记录从开始导入 main.py 到首次绘制、到可交互的耗时，打印后关闭窗口"""
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.marks = {"导入完成": IMPORTED_TIME - STARTUP_TIME}
+        self.mark("窗口已创建")
+        window.installEventFilter(self)
+        window.ready.connect(self.on_ready)
+    def mark(self, label):
+        self.marks.setdefault(label, time.perf_counter() - STARTUP_TIME)
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.mark("首次绘制")
+            obj.removeEventFilter(self)
+        return False
+    def on_ready(self):
+        self.mark("可交互")
+        for label, elapsed in self.marks.items():
+            print(f"{label:<8} {elapsed * 1000:10.1f} ms")
+        QTimer.singleShot(0, self.window.close)
 
 if __name__ == "__main__":
+    profile_startup = "--profile-startup" in sys.argv
+    if profile_startup: sys.argv.remove("--profile-startup")
     app = QApplication(sys.argv)
-    database.ensure_db_tables()
+    vocabularies.open_current()
+    app.aboutToQuit.connect(database.close_db)
     window = MainWindow()
+    if profile_startup: profiler = StartupProfiler(window)
     window.show()
     sys.exit(app.exec())
@@ -0,0 +1,509 @@
+# management.py
+"""数据管理对话框：键/值列表的浏览、排序、增删改与 Markdown 导入/导出。主窗口在首次打开时才导入本模块"""
+from datetime import datetime
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QMessageBox,
+    QDialog, QListView, QInputDialog, QMenu, QAbstractItemView, QFileDialog, QCheckBox, QProgressDialog,
+    QStyledItemDelegate, QStyleOptionViewItem, QStyle, QApplication
+)
+from PySide6.QtCore import Qt, Signal, QSettings, QTimer, QAbstractListModel, QModelIndex, QRect
+from PySide6.QtGui import QColor, QPalette, QKeySequence, QShortcut
+
+import database
+import data_io
+import perf
+
+# <<< ItemListModel: 数据管理用的虚拟列表，按页从数据库（或搜索结果）加载，只物化滚动到的部分 >>>
+class ItemListModel(QAbstractListModel):
+    PAGE_SIZE = 500
+    order_changed = Signal()
+    def __init__(self, table_name, search_index, sort_mode="sort_order", parent=None):
+        super().__init__(parent)
+        self.table_name = table_name
+        self.search_index = search_index
+        self.sort_mode = sort_mode
+        self.filter_text = ""
+        self.matches = None  # 搜索模式下的全部匹配 [(id, text)]，行从这里分页取出
+        self.rows = []       # 已加载的 [(id, text)]
+        self.total = 0
+    def reload(self):
+        self.beginResetModel()
+        if self.filter_text:
+            self.matches = self.search_index.search_items(self.filter_text, None)
+            self.total = len(self.matches)
+            self.rows = self.matches[:self.PAGE_SIZE]
+        else:
+            self.matches = None
+            self.total = database.count_items(self.table_name)
+            self.rows = database.get_items_page(self.table_name, self.sort_mode, None, self.PAGE_SIZE)
+        self.endResetModel()
+    def set_filter(self, text):
+        previous = self.filter_text.casefold()
+        self.filter_text = text
+        if previous and self.matches is not None and previous in text.casefold():
+            # 查询只是变长了：新结果一定是上一次匹配的子集，只在其中筛选
+            self.beginResetModel()
+            self.matches = self.search_index.narrow_items(text, self.matches)
+            self.total = len(self.matches)
+            self.rows = self.matches[:self.PAGE_SIZE]
+            self.endResetModel()
+        else:
+            self.reload()
+    def can_reorder(self):
+        return self.sort_mode == "sort_order" and self.matches is None
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+    def canFetchMore(self, parent):
+        return not parent.isValid() and len(self.rows) < self.total
+    def fetchMore(self, parent):
+        if parent.isValid(): return
+        start = len(self.rows)
+        if self.matches is not None:
+            page = self.matches[start:start + self.PAGE_SIZE]
+        else:
+            # 从已加载的最后一项接着读，而不是按行号偏移
+            page = database.get_items_page(self.table_name, self.sort_mode, self.rows[-1][0] if self.rows else None, self.PAGE_SIZE)
+        if not page:
+            self.total = start
+            return
+        self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+        self.rows.extend(page)
+        self.endInsertRows()
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows): return None
+        item_id, text = self.rows[index.row()]
+        if role in (Qt.DisplayRole, Qt.EditRole): return text
+        if role == Qt.UserRole: return item_id
+        return None
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled if self.can_reorder() else Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if self.can_reorder(): flags |= Qt.ItemIsDragEnabled
+        return flags
+    def supportedDropActions(self):
+        return Qt.MoveAction
+    def moveRows(self, source_parent, source_row, count, destination_parent, destination_child):
+        # QListView 的 InternalMove 拖放会直接调用 moveRows
+        if not self.can_reorder() or source_parent.isValid() or destination_parent.isValid(): return False
+        if source_row <= destination_child <= source_row + count: return False
+        if not self.beginMoveRows(QModelIndex(), source_row, source_row + count - 1, QModelIndex(), destination_child): return False
+        moved = self.rows[source_row:source_row + count]
+        del self.rows[source_row:source_row + count]
+        insert_at = destination_child - count if destination_child > source_row else destination_child
+        self.rows[insert_at:insert_at] = moved
+        self.endMoveRows()
+        self.order_changed.emit()
+        return True
+    def update_text(self, row, text):
+        if self.matches is None and self.sort_mode in ("alpha_asc", "alpha_desc"):
+            # 字母序下改名会改变位置，也会改变键集分页的接续点：移到新位置
+            item_id = self.rows[row][0]
+            self.remove_row(row)
+            self.insert_item(item_id, text)
+            return
+        self.rows[row] = (self.rows[row][0], text)
+        if self.matches is not None: self.matches[row] = self.rows[row]
+        self.dataChanged.emit(self.index(row), self.index(row))
+    def row_of(self, item_id):
+        """已加载部分中 item_id 所在的行，不在其中时返回 None"""
+        return next((row for row, (loaded_id, _) in enumerate(self.rows) if loaded_id == item_id), None)
+    def insert_item(self, item_id, text):
+        """把新添加的项放进已加载的部分，不重置模型，已加载的页和滚动位置都保留"""
+        if self.row_of(item_id) is not None: return  # 写入完成前模型已重新加载过
+        if self.matches is not None:
+            # 搜索模式：匹配的新项排在最前
+            if self.filter_text.casefold() not in text.casefold(): return
+            row = 0
+            self.matches.insert(0, (item_id, text))
+        else:
+            row = database.get_item_position(self.table_name, self.sort_mode, item_id)
+            if row is None: return
+            if row >= len(self.rows) and len(self.rows) < self.total:
+                # 落在尚未加载的部分：以后翻页时自然会读到
+                self.total += 1
+                return
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.insert(row, (item_id, text))
+        self.total += 1
+        self.endInsertRows()
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        if self.matches is not None: del self.matches[row]
+        self.total -= 1
+        self.endRemoveRows()
+
+# <<< HighlightDelegate: 在列表项中高亮搜索词 >>>
+class HighlightDelegate(QStyledItemDelegate):
+    HIGHLIGHT_COLOR = QColor(255, 225, 110)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.query = ""  # casefold 后的搜索词
+    def match_spans(self, text):
+        """text 中所有匹配的 (起点, 终点)；casefold 改变了长度的文本无法对应位置，不高亮"""
+        folded = text.casefold()
+        if not self.query or len(folded) != len(text): return []
+        spans, start = [], folded.find(self.query)
+        while start != -1:
+            spans.append((start, start + len(self.query)))
+            start = folded.find(self.query, start + len(self.query))
+        return spans
+    def paint(self, painter, option, index):
+        text = index.data(Qt.DisplayRole) or ""
+        spans = self.match_spans(text)
+        if not spans:
+            return super().paint(painter, option, index)
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        opt.text = ""
+        style = opt.widget.style() if opt.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, opt, painter, opt.widget)
+        rect = style.subElementRect(QStyle.SE_ItemViewItemText, opt, opt.widget)
+        margin = style.pixelMetric(QStyle.PM_FocusFrameHMargin, None, opt.widget) + 1
+        selected = bool(opt.state & QStyle.State_Selected)
+        metrics = opt.fontMetrics
+        painter.save()
+        painter.setClipRect(rect)
+        painter.setPen(opt.palette.color(QPalette.HighlightedText if selected else QPalette.Text))
+        x, end = rect.x() + margin, 0
+        pieces = []
+        for start, stop in spans:
+            pieces.append((text[end:start], False))
+            pieces.append((text[start:stop], True))
+            end = stop
+        pieces.append((text[end:], False))
+        for piece, matched in pieces:
+            if not piece: continue
+            width = metrics.horizontalAdvance(piece)
+            piece_rect = QRect(x, rect.y(), width, rect.height())
+            if matched and not selected:
+                painter.fillRect(piece_rect, self.HIGHLIGHT_COLOR)
+            painter.drawText(piece_rect, Qt.AlignVCenter | Qt.AlignLeft | Qt.TextSingleLine, piece)
+            x += width
+            if x > rect.right(): break
+        painter.restore()
+
+# <<< DataManagerWidget (基于 QListView + ItemListModel) >>>
+class DataManagerWidget(QWidget):
+    FILTER_DELAY = 150  # 毫秒：连续输入期间只在停顿后筛选一次
+    data_changed = Signal()
+    def __init__(self, title, table_name, search_index, db_worker, parent=None):
+        super().__init__(parent)
+        self.table_name = table_name
+        # 增删改都排进数据库工作线程，GUI 线程不等待写锁
+        self.db_worker = db_worker
+        self.search_index = search_index
+        self.settings = QSettings()
+        layout = QVBoxLayout(self)
+        top_layout = QHBoxLayout()
+        self.search_box = QLineEdit(placeholderText=f"搜索{title}...")
+        self.sort_btn = QPushButton("排序")
+        self.sort_menu = QMenu()
+        self.sort_btn.setMenu(self.sort_menu)
+        top_layout.addWidget(self.search_box)
+        top_layout.addWidget(self.sort_btn)
+
+        self.model = ItemListModel(table_name, search_index, self.settings.value(f"sort_order/{table_name}", "sort_order"), self)
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setDragDropMode(QAbstractItemView.InternalMove)
+        self.list_view.setDefaultDropAction(Qt.MoveAction)
+        self.list_view.setToolTip("双击编辑，右键删除，拖动排序")
+        self.list_view.setModel(self.model)
+        self.highlighter = HighlightDelegate(self.list_view)
+        self.list_view.setItemDelegate(self.highlighter)
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(self.FILTER_DELAY)
+
+        layout.addLayout(top_layout)
+        layout.addWidget(self.list_view)
+
+        self.setup_sort_menu()
+        self.connect_signals()
+        self.populate_list()
+
+    def setup_sort_menu(self):
+        self.sort_menu.addAction("手动排序", lambda: self.set_sort_order("sort_order"))
+        self.sort_menu.addAction("按字母升序", lambda: self.set_sort_order("alpha_asc"))
+        self.sort_menu.addAction("按字母降序", lambda: self.set_sort_order("alpha_desc"))
+
+    def set_sort_order(self, order):
+        self.settings.setValue(f"sort_order/{self.table_name}", order)
+        self.settings.sync()
+        self.model.sort_mode = order
+        self.populate_list()
+
+    def connect_signals(self):
+        self.list_view.doubleClicked.connect(self.edit_item)
+        self.search_box.textChanged.connect(self.schedule_filter)
+        self.search_box.returnPressed.connect(self.apply_filter)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.list_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.list_view.customContextMenuRequested.connect(self.show_context_menu)
+        self.model.order_changed.connect(lambda: QTimer.singleShot(0, self.update_db_sort_order))
+
+    @perf.timed("DataManagerWidget.populate_list")
+    def populate_list(self):
+        self.model.reload()
+        self.list_view.setDragEnabled(self.model.can_reorder())
+
+    def update_db_sort_order(self):
+        loaded = [item_id for item_id, _ in self.model.rows]
+        # 只加载了前几页时，尚未加载的部分保持原有顺序接在后面
+        loaded_set = set(loaded)
+        rest = [item_id for item_id in database.get_item_ids(self.table_name, "tree") if item_id not in loaded_set]
+        self.submit_write(self.on_sort_order_saved, database.update_sort_order, self.table_name, loaded + rest)
+
+    def submit_write(self, on_finished, func, *args):
+        task = self.db_worker.submit_write(func, *args)
+        task.finished.connect(on_finished)
+        task.failed.connect(lambda message: QMessageBox.warning(self, "错误", message))
+
+    def on_sort_order_saved(self, result):
+        success, msg = result
+        if not success:
+            QMessageBox.warning(self, "错误", msg)
+            self.populate_list()  # 退回库中的顺序
+        elif [item_id for item_id, _ in self.model.rows] != database.get_item_ids(self.table_name, "tree")[:len(self.model.rows)]:
+            # 拖动排序不改变所属分组：拖进其他分组的项留在原分组中，按库中的实际顺序重新显示
+            self.populate_list()
+        self.data_changed.emit()
+
+    def schedule_filter(self, text):
+        """每次按键只重启计时器，打字或粘贴产生的一串变化合并为一次筛选；清空搜索框立即生效"""
+        if text:
+            self.filter_timer.start()
+        else:
+            self.apply_filter()
+
+    def apply_filter(self):
+        self.filter_timer.stop()
+        text = self.search_box.text()
+        if text != self.model.filter_text:
+            self.filter_list(text)
+
+    @perf.timed("DataManagerWidget.filter_list")
+    def filter_list(self, text):
+        self.highlighter.query = text.casefold()
+        self.model.set_filter(text)
+        self.list_view.setDragEnabled(self.model.can_reorder())
+
+    def show_context_menu(self, pos):
+        menu = QMenu()
+        add_item_action = menu.addAction("添加新项...")
+        index = self.list_view.indexAt(pos)
+        if index.isValid():
+            menu.addSeparator()
+            delete_action = menu.addAction("删除该项")
+        else:
+            delete_action = None
+        action = menu.exec(self.list_view.mapToGlobal(pos))
+        if action == add_item_action: self.add_item()
+        elif action == delete_action and index.isValid(): self.delete_item(index)
+
+    def add_item(self):
+        text, ok = QInputDialog.getText(self, "添加新项", "请输入内容:")
+        if ok and text:
+            self.submit_write(lambda result: self.on_item_added(text, result), database.add_item, self.table_name, text)
+
+    def on_item_added(self, text, result):
+        success, result = result
+        if success:
+            self.model.insert_item(result, text)
+            self.data_changed.emit()
+        else:
+            QMessageBox.warning(self, "错误", result)
+
+    def edit_item(self, index):
+        item_id = index.data(Qt.UserRole)
+        old_text = index.data(Qt.DisplayRole)
+        new_text, ok = QInputDialog.getText(self, "编辑项", "请输入新内容:", text=old_text)
+        if ok and new_text and new_text != old_text:
+            self.submit_write(lambda result: self.on_item_edited(item_id, new_text, result),
+                              database.update_item_text, self.table_name, item_id, new_text)
+
+    def on_item_edited(self, item_id, new_text, result):
+        success, msg = result
+        if success:
+            # 写入完成前列表可能已翻页或重新加载：按 id 找行
+            row = self.model.row_of(item_id)
+            if row is not None: self.model.update_text(row, new_text)
+            self.data_changed.emit()
+        else:
+            QMessageBox.warning(self, "错误", msg)
+
+    def delete_item(self, index):
+        item_id = index.data(Qt.UserRole)
+        if QMessageBox.question(self, "确认删除", f"确定要删除 '{index.data(Qt.DisplayRole)}' 吗？", QMessageBox.Yes | QMessageBox.No, QMessageBox.No) == QMessageBox.Yes:
+            # 注意：这里不再是递归删除
+            self.submit_write(lambda result: self.on_item_deleted(item_id, result), database.delete_item, self.table_name, item_id)
+
+    def on_item_deleted(self, item_id, result):
+        success, msg = result
+        if success:
+            row = self.model.row_of(item_id)
+            if row is not None: self.model.remove_row(row)
+            self.data_changed.emit()
+        else:
+            QMessageBox.warning(self, "错误", msg)
+
+class ManagementDialog(QDialog):
+    data_changed = Signal()
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("数据管理")
+        self.setMinimumSize(700, 500)
+        self.db_worker = parent.db_worker
+        self.current_task = None
+        main_layout = QVBoxLayout(self)
+        data_layout = QHBoxLayout()
+        self.keys_manager = DataManagerWidget("键", "keys", parent.key_index, self.db_worker)
+        self.values_manager = DataManagerWidget("值", "value_items", parent.value_index, self.db_worker)
+        data_layout.addWidget(self.keys_manager)
+        data_layout.addWidget(self.values_manager)
+        io_layout = QHBoxLayout()
+        self.undo_btn = QPushButton("撤销")
+        self.redo_btn = QPushButton("重做")
+        self.export_btn = QPushButton("导出...")
+        self.import_btn = QPushButton("导入...")
+        self.fts_checkbox = QCheckBox("数据库搜索 (FTS5)")
+        self.fts_checkbox.setToolTip("词库很大时在数据库中搜索，不把整张表载入内存（重启后生效）")
+        self.fts_checkbox.setChecked(QSettings().value("search_backend", "memory") == "fts")
+        io_layout.addWidget(self.fts_checkbox)
+        io_layout.addStretch()
+        io_layout.addWidget(self.undo_btn)
+        io_layout.addWidget(self.redo_btn)
+        io_layout.addWidget(self.export_btn)
+        io_layout.addWidget(self.import_btn)
+        io_layout.addStretch()
+        main_layout.addLayout(data_layout)
+        main_layout.addLayout(io_layout)
+        self.keys_manager.data_changed.connect(self.data_changed.emit)
+        self.values_manager.data_changed.connect(self.data_changed.emit)
+        self.keys_manager.data_changed.connect(self.update_journal_buttons)
+        self.values_manager.data_changed.connect(self.update_journal_buttons)
+        self.undo_btn.clicked.connect(self.undo)
+        self.redo_btn.clicked.connect(self.redo)
+        QShortcut(QKeySequence.Undo, self, self.undo)
+        QShortcut(QKeySequence.Redo, self, self.redo)
+        self.export_btn.clicked.connect(self.export_data)
+        self.import_btn.clicked.connect(self.import_data)
+        self.fts_checkbox.toggled.connect(lambda checked: QSettings().setValue("search_backend", "fts" if checked else "memory"))
+        self.update_journal_buttons()
+    def start_task(self, title, func, on_finished, error_prefix, *args):
+        """把 func(progress, *args) 交给后台数据库线程执行，用非阻塞的进度框显示进度并支持取消"""
+        self.set_io_enabled(False)
+        task = self.db_worker.submit(func, *args)
+        dialog = QProgressDialog(title, "取消", 0, 1000, self)
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(300)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+        dialog.canceled.connect(task.cancel)
+        task.progress.connect(lambda done, total: dialog.setValue(int(done * 1000 / total) if total else 1000), Qt.QueuedConnection)
+        def finish():
+            dialog.close()
+            self.current_task = None
+            self.set_io_enabled(True)
+        def on_success(result):
+            finish()
+            on_finished(result)
+        def on_failed(message):
+            finish()
+            QMessageBox.critical(self, "错误", f"{error_prefix}: {message}")
+        def on_cancelled():
+            finish()
+            QMessageBox.information(self, "提示", "操作已取消。")
+        # 信号从工作线程发出，显式排队回 GUI 线程
+        task.finished.connect(on_success, Qt.QueuedConnection)
+        task.failed.connect(on_failed, Qt.QueuedConnection)
+        task.cancelled.connect(on_cancelled, Qt.QueuedConnection)
+        self.current_task = task
+    def set_io_enabled(self, enabled):
+        self.export_btn.setEnabled(enabled)
+        self.import_btn.setEnabled(enabled)
+        # 导入/撤销进行中时条目的增删改会排在其后、作用在被替换前的数据上：一并禁用
+        self.keys_manager.setEnabled(enabled)
+        self.values_manager.setEnabled(enabled)
+        if enabled:
+            self.update_journal_buttons()
+        else:
+            self.undo_btn.setEnabled(False)
+            self.redo_btn.setEnabled(False)
+    def update_journal_buttons(self):
+        undo_label, redo_label = database.journal_state()
+        self.undo_btn.setEnabled(undo_label is not None)
+        self.undo_btn.setToolTip(f"撤销: {undo_label} (Ctrl+Z)" if undo_label else "没有可撤销的操作")
+        self.redo_btn.setEnabled(redo_label is not None)
+        self.redo_btn.setToolTip(f"重做: {redo_label} (Ctrl+Y)" if redo_label else "没有可重做的操作")
+    def undo(self):
+        if self.current_task is None and self.undo_btn.isEnabled():
+            self.start_task("正在撤销...", lambda progress: database.undo(), self.on_journal_applied, "撤销失败")
+    def redo(self):
+        if self.current_task is None and self.redo_btn.isEnabled():
+            self.start_task("正在重做...", lambda progress: database.redo(), self.on_journal_applied, "重做失败")
+    def on_journal_applied(self, result):
+        success, msg = result
+        self.keys_manager.populate_list()
+        self.values_manager.populate_list()
+        self.data_changed.emit()
+        if not success:
+            QMessageBox.warning(self, "错误", msg)
+    EXPORT_FILTERS = {
+        "Markdown Files (*.md)": ".md",
+        "QuickKV JSONL，保留分组和排序 (*.jsonl)": ".jsonl",
+        "QuickKV JSONL，gzip 压缩 (*.jsonl.gz)": ".jsonl.gz",
+    }
+    def export_data(self):
+        file_name = f"QuickKV导出-{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+        path, selected = QFileDialog.getSaveFileName(self, "导出数据", file_name + ".md", ";;".join(self.EXPORT_FILTERS))
+        if not path: return
+        suffix = self.EXPORT_FILTERS.get(selected, ".md")
+        if not path.endswith((".md", ".jsonl", ".jsonl.gz")):
+            path += suffix
+        if data_io.is_jsonl(path):
+            export = lambda progress: data_io.export_jsonl(path, progress)
+        else:
+            sort_modes = {manager.table_name: manager.model.sort_mode for manager in (self.keys_manager, self.values_manager)}
+            export = lambda progress: data_io.export_markdown(path, sort_modes, progress)
+        self.start_task(
+            "正在导出...", export,
+            lambda _: QMessageBox.information(self, "成功", f"数据已成功导出到:\n{path}"), "导出文件失败")
+    def import_data(self):
+        path, _ = QFileDialog.getOpenFileName(self, "导入数据", "", "QuickKV 数据 (*.md *.jsonl *.jsonl.gz);;" + ";;".join(self.EXPORT_FILTERS))
+        if not path: return
+        if data_io.is_jsonl(path):
+            merge, replace = data_io.merge_jsonl, data_io.import_jsonl
+            replace_hint = "覆盖：按文件完整恢复所有的键和值，包括分组和排序（导入前会自动保存快照，可以撤销）。"
+        else:
+            merge, replace = data_io.merge_markdown, data_io.import_markdown
+            replace_hint = "覆盖：完全替换当前所有的键和值（导入前会自动保存快照，可以撤销）。"
+        box = QMessageBox(QMessageBox.Question, "选择导入方式",
+                          "合并：只添加文件中新增的项，保留现有的项、分组和排序。\n"
+                          "同步：合并，并删除文件中没有的项。\n" + replace_hint, parent=self)
+        merge_btn = box.addButton("合并", QMessageBox.AcceptRole)
+        sync_btn = box.addButton("同步", QMessageBox.AcceptRole)
+        replace_btn = box.addButton("覆盖", QMessageBox.DestructiveRole)
+        box.addButton(QMessageBox.Cancel)
+        box.setDefaultButton(merge_btn)
+        box.exec()
+        clicked = box.clickedButton()
+        if clicked in (merge_btn, sync_btn):
+            remove_missing = clicked == sync_btn
+            self.start_task("正在导入...", lambda progress: merge(path, remove_missing, progress), self.on_imported, "导入文件失败")
+        elif clicked == replace_btn:
+            self.start_task("正在导入...", lambda progress: replace(path, progress), self.on_imported, "导入文件失败")
+    def on_imported(self, result):
+        self.keys_manager.populate_list()
+        self.values_manager.populate_list()
+        self.data_changed.emit()
+        if result and isinstance(next(iter(result.values())), dict):
+            summary = "\n".join(f"{title}: 新增 {result[table_name]['inserted']}，删除 {result[table_name]['removed']}，未变 {result[table_name]['unchanged']}"
+                                for table_name, title in data_io.SECTIONS)
+            QMessageBox.information(self, "成功", f"数据合并成功！\n{summary}")
+        else:
+            QMessageBox.information(self, "成功", "数据导入成功！")
+    def parse_md_content(self, lines):
+        return data_io.parse_md_lines(lines)
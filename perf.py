@@ -0,0 +1,212 @@
+# perf.py
+"""
+轻量的计时与计数层，不依赖 GUI。默认关闭，关闭时 timed / measure 只多一次标志判断。
+
+开启方式：环境变量 QUICKKV_PERF=1，或运行时调用 enable()（诊断面板 Ctrl+Shift+D 中也可切换）。
+QUICKKV_SLOW_QUERY_MS 设置慢查询阈值（毫秒，默认 50），QUICKKV_SLOW_QUERY_LOG 指定慢查询日志文件。
+"""
+import csv
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+SAMPLE_LIMIT = 10000  # 每项操作保留的最近耗时样本数，分位数基于这些样本
+SLOW_QUERY_LIMIT = 200  # 内存中保留的最近慢查询条数
+# 直方图的桶上界（毫秒），最后一个桶收纳更慢的样本
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_enabled = os.environ.get("QUICKKV_PERF", "") not in ("", "0")
+slow_query_ms = float(os.environ.get("QUICKKV_SLOW_QUERY_MS", "50"))
+slow_query_log = os.environ.get("QUICKKV_SLOW_QUERY_LOG") or None
+
+class OperationStats:
+    """一项操作的调用次数、总耗时、行数与最近的耗时样本（秒）"""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=SAMPLE_LIMIT)
+
+    def add(self, elapsed, rows=None):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        if rows is not None and rows > 0:
+            self.rows += rows
+        self.samples.append(elapsed)
+
+_lock = threading.Lock()
+_stats = {}
+slow_queries = deque(maxlen=SLOW_QUERY_LIMIT)  # [(时间戳, 耗时毫秒, SQL), ...]
+
+def enabled():
+    return _enabled
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+def reset():
+    with _lock:
+        _stats.clear()
+        slow_queries.clear()
+
+def record(name, elapsed, rows=None):
+    """登记一次耗时 elapsed 秒的操作；rows 为其读写的行数（未知时为 None）"""
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = OperationStats()
+        stats.add(elapsed, rows)
+
+class _Measure:
+    __slots__ = ("name", "rows", "start")
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start, self.rows)
+        return False
+
+class _NullMeasure:
+    """关闭时 measure() 返回的共享空对象；给 rows 赋值也不会出错"""
+    __slots__ = ()
+    rows = None
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def __setattr__(self, name, value):
+        pass
+
+_NULL_MEASURE = _NullMeasure()
+
+def measure(name):
+    """with measure("名称") as m: ...；可在块内设置 m.rows 记录行数"""
+    return _Measure(name) if _enabled else _NULL_MEASURE
+
+def timed(name=None):
+    """装饰器：为函数计时，名称默认为 模块.函数名"""
+    def decorator(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+# <<< SQL 语句计时 >>>
+_WHITESPACE = re.compile(r"\s+")
+
+def _sql_label(sql):
+    text = _WHITESPACE.sub(" ", sql).strip()
+    return "sql: " + (text if len(text) <= 80 else text[:77] + "...")
+
+def _record_sql(sql, elapsed, rows):
+    record(_sql_label(sql), elapsed, rows)
+    elapsed_ms = elapsed * 1000
+    if elapsed_ms >= slow_query_ms:
+        entry = (time.strftime("%Y-%m-%d %H:%M:%S"), elapsed_ms, _WHITESPACE.sub(" ", sql).strip())
+        slow_queries.append(entry)
+        if slow_query_log:
+            with open(slow_query_log, "a", encoding="utf-8") as f:
+                f.write(f"{entry[0]}\t{entry[1]:.1f} ms\t{entry[2]}\n")
+
+class TimedConnection(sqlite3.Connection):
+    """
+    为 execute / executemany 计时的连接（用作 sqlite3.connect 的 factory）。
+    只统计语句执行本身；返回游标之后逐行迭代的耗时计入调用方的操作。
+    行数取自 cursor.rowcount，只对写语句有效（SELECT 为 -1，不计）；读路径的行数由调用方在 measure() 中设置。
+    """
+    def execute(self, sql, parameters=()):
+        if not _enabled:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        cursor = super().execute(sql, parameters)
+        _record_sql(sql, time.perf_counter() - start, cursor.rowcount)
+        return cursor
+
+    def executemany(self, sql, seq_of_parameters):
+        if not _enabled:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        cursor = super().executemany(sql, seq_of_parameters)
+        _record_sql(sql, time.perf_counter() - start, cursor.rowcount)
+        return cursor
+
+# <<< 汇总与导出 >>>
+def _percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+def _histogram(samples):
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for elapsed in samples:
+        elapsed_ms = elapsed * 1000
+        for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if elapsed_ms <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    return counts
+
+def summary(histograms=False):
+    """按总耗时从高到低返回每项操作的统计（耗时单位毫秒）"""
+    with _lock:
+        snapshot = [(name, stats.count, stats.total, stats.max, stats.rows, sorted(stats.samples))
+                    for name, stats in _stats.items()]
+    rows = []
+    for name, count, total, max_elapsed, row_count, samples in snapshot:
+        entry = {
+            "name": name,
+            "count": count,
+            "total_ms": total * 1000,
+            "mean_ms": total * 1000 / count if count else 0.0,
+            "p50_ms": _percentile(samples, 0.5) * 1000,
+            "p95_ms": _percentile(samples, 0.95) * 1000,
+            "max_ms": max_elapsed * 1000,
+            "rows": row_count,
+        }
+        if histograms:
+            entry["histogram"] = _histogram(samples)
+        rows.append(entry)
+    rows.sort(key=lambda entry: entry["total_ms"], reverse=True)
+    return rows
+
+def export_json(path):
+    payload = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "histogram_bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+        "operations": summary(histograms=True),
+        "slow_queries": [{"time": t, "elapsed_ms": ms, "sql": sql} for t, ms, sql in list(slow_queries)],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+def export_csv(path):
+    """每项操作一行；直方图各桶按 le_<上界ms> 列展开，最后一列 gt_<最大上界ms>"""
+    bucket_columns = [f"le_{bound}" for bound in HISTOGRAM_BOUNDS_MS] + [f"gt_{HISTOGRAM_BOUNDS_MS[-1]}"]
+    columns = ["name", "count", "total_ms", "mean_ms", "p50_ms", "p95_ms", "max_ms", "rows"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns + bucket_columns)
+        for entry in summary(histograms=True):
+            writer.writerow([entry[column] for column in columns] + entry["histogram"])
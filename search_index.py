@@ -0,0 +1,357 @@
+# search_index.py
+"""键/值的子串搜索引擎：文本只 casefold 一次，用三元组倒排索引定位候选，支持增量更新"""
+import bisect
+import heapq
+from collections import defaultdict
+
+import database
+
+NGRAM = 3
+TOP_K = 64  # 每个前缀预先保留的高频条目数
+NARROW_RATIO = 4  # 上一次的匹配不超过全部条目的 1/NARROW_RATIO 时，才在其中筛选
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+class SearchIndex:
+    """
+    内存子串索引。条目按 id 存放，查询时：
+    - 查询长度 >= NGRAM：取各三元组倒排表的交集作为候选，再用子串匹配确认；
+    - 更短的查询：前缀匹配由按 casefold 文本排序的列表二分得到，不足 limit 时再按原始顺序
+      扫描包含匹配并在凑满后提前停止（这类查询本就会命中大量条目）。
+    结果按 完全匹配 > 用过的条目（按使用分数）> 前缀匹配 > 匹配位置靠前 > 文本较短 > 原始顺序 排名。
+    用过的条目按查询的前 NGRAM 个字符缓存前 TOP_K 名，逐键输入时无需重新排序。
+    """
+    def __init__(self):
+        self.texts = {}
+        self.folded = {}
+        self.positions = {}
+        self.postings = defaultdict(set)
+        self.sorted_keys = []  # [(casefold 文本, id)]，用于前缀查找
+        self._next_position = 0
+        self.usage = {}  # casefold 文本 -> 排名值（见 database.usage_rank）
+        self.ranks = {}  # id -> 排名值，只含用过的条目
+        self._top_used = {}  # 查询前缀 -> 包含该前缀、排名值最高的 TOP_K 个 id
+
+    def __len__(self):
+        return len(self.texts)
+
+    def reset_items(self, items):
+        """items: get_all_items 返回的行，分组行不参与搜索"""
+        self.texts.clear()
+        self.folded.clear()
+        self.positions.clear()
+        self.postings.clear()
+        self.sorted_keys = []
+        self._next_position = 0
+        self.ranks.clear()
+        self._top_used.clear()
+        for item_id, text, _, is_group, _ in items:
+            if not is_group:
+                self._add(item_id, text)
+        self.sorted_keys = sorted((folded, item_id) for item_id, folded in self.folded.items())
+
+    def replace_with(self, other):
+        """接管另一个（通常在后台线程中建好的）索引的全部内容，O(1)"""
+        self.texts, self.folded, self.positions = other.texts, other.folded, other.positions
+        self.postings, self.sorted_keys = other.postings, other.sorted_keys
+        self._next_position = other._next_position
+        self.usage, self.ranks, self._top_used = other.usage, other.ranks, other._top_used
+
+    def set_usage(self, rows):
+        """rows: database.get_usage 返回的 [(文本, 排名值), ...]，可以是全部也可以是部分"""
+        for text, rank in rows:
+            folded = text.casefold()
+            # 大小写不同的文本共用一个 casefold 键，取最高的排名值
+            if rank <= self.usage.get(folded, float("-inf")):
+                continue
+            self.usage[folded] = rank
+            for _, item_id in self._exact_range(folded):
+                self.ranks[item_id] = rank
+        self._top_used.clear()
+
+    def _add(self, item_id, text):
+        folded = text.casefold()
+        self.texts[item_id] = text
+        self.folded[item_id] = folded
+        self.positions[item_id] = self._next_position
+        self._next_position += 1
+        for gram in _ngrams(folded):
+            self.postings[gram].add(item_id)
+        self._set_rank(item_id, folded)
+        return folded
+
+    def _set_rank(self, item_id, folded):
+        rank = self.usage.get(folded)
+        if rank is not None:
+            self.ranks[item_id] = rank
+            self._top_used.clear()
+        elif self.ranks.pop(item_id, None) is not None:
+            self._top_used.clear()
+
+    def insert_item(self, item_id, text):
+        if item_id in self.texts:
+            self.remove_item(item_id)
+        bisect.insort(self.sorted_keys, (self._add(item_id, text), item_id))
+
+    def update_item(self, item_id, text):
+        if item_id not in self.texts:
+            return
+        old_grams = _ngrams(self.folded[item_id])
+        folded = text.casefold()
+        new_grams = _ngrams(folded)
+        for gram in old_grams - new_grams:
+            self._discard_posting(gram, item_id)
+        for gram in new_grams - old_grams:
+            self.postings[gram].add(item_id)
+        self._discard_sorted(self.folded[item_id], item_id)
+        bisect.insort(self.sorted_keys, (folded, item_id))
+        self.texts[item_id] = text
+        self.folded[item_id] = folded
+        self._set_rank(item_id, folded)
+
+    def remove_item(self, item_id):
+        folded = self.folded.pop(item_id, None)
+        if folded is None:
+            return
+        del self.texts[item_id]
+        del self.positions[item_id]
+        if self.ranks.pop(item_id, None) is not None:
+            self._top_used.clear()
+        self._discard_sorted(folded, item_id)
+        for gram in _ngrams(folded):
+            self._discard_posting(gram, item_id)
+
+    def _discard_sorted(self, folded, item_id):
+        i = bisect.bisect_left(self.sorted_keys, (folded, item_id))
+        if i < len(self.sorted_keys) and self.sorted_keys[i] == (folded, item_id):
+            del self.sorted_keys[i]
+
+    def _discard_posting(self, gram, item_id):
+        ids = self.postings.get(gram)
+        if ids is not None:
+            ids.discard(item_id)
+            if not ids:
+                del self.postings[gram]
+
+    def match_ids(self, query):
+        """所有包含 query（不区分大小写）的条目 id，无序"""
+        query = query.casefold()
+        if not query:
+            return set(self.texts)
+        if len(query) < NGRAM:
+            return {item_id for item_id, folded in self.folded.items() if query in folded}
+        posting_lists = []
+        for gram in _ngrams(query):
+            ids = self.postings.get(gram)
+            if not ids:
+                return set()
+            posting_lists.append(ids)
+        posting_lists.sort(key=len)
+        candidates = posting_lists[0].intersection(*posting_lists[1:])
+        if len(query) == NGRAM:
+            return candidates
+        folded = self.folded
+        return {item_id for item_id in candidates if query in folded[item_id]}
+
+    def _rank_key(self, query):
+        folded, positions, ranks = self.folded, self.positions, self.ranks
+        unused = float("inf")
+        def key(item_id):
+            text = folded[item_id]
+            index = text.find(query)
+            kind = 0 if text == query else (1 if index == 0 else 2)
+            rank = ranks.get(item_id)
+            return (kind != 0, unused if rank is None else -rank, kind, index, len(text), positions[item_id])
+        return key
+
+    def _exact_range(self, folded):
+        keys = self.sorted_keys
+        start = bisect.bisect_left(keys, (folded,))
+        end = start
+        while end < len(keys) and keys[end][0] == folded:
+            end += 1
+        return keys[start:end]
+
+    def top_used_ids(self, query, limit=20):
+        """包含 query 的用过的条目，按排名值从高到低，最多 limit 个"""
+        query = query.casefold()
+        prefix = query[:NGRAM]
+        top = self._top_used.get(prefix)
+        if top is None:
+            ranks, folded = self.ranks, self.folded
+            top = heapq.nlargest(TOP_K, (item_id for item_id in ranks if prefix in folded[item_id]), key=ranks.get)
+            self._top_used[prefix] = top
+        if len(query) > NGRAM:
+            top = [item_id for item_id in top if query in self.folded[item_id]]
+        return top[:limit]
+
+    def _prefix_range(self, query):
+        keys = self.sorted_keys
+        return keys[bisect.bisect_left(keys, (query,)):bisect.bisect_left(keys, (query + "\U0010ffff",))]
+
+    def prefix_ids(self, query):
+        """casefold 后以 query 开头的条目 id，按文本排序"""
+        return [item_id for _, item_id in self._prefix_range(query.casefold())]
+
+    def _search_short(self, query, limit):
+        """短查询：前缀匹配优先，不足时按原始顺序补充包含匹配"""
+        positions = self.positions
+        ranked = [item_id for _, item_id in heapq.nsmallest(
+            limit, self._prefix_range(query), key=lambda entry: (len(entry[0]), positions[entry[1]]))]
+        if len(ranked) >= limit:
+            return ranked
+        for item_id, folded in self.folded.items():
+            if query in folded and not folded.startswith(query):
+                ranked.append(item_id)
+                if len(ranked) >= limit:
+                    break
+        return ranked
+
+    def search_ids(self, query, limit=20):
+        """排名前 limit 的条目 id"""
+        folded_query = query.casefold()
+        if not self.ranks or limit is None:
+            return self._search_ids(folded_query, limit)
+        used = self.top_used_ids(folded_query, limit)
+        if not used:
+            return self._search_ids(folded_query, limit)
+        # 完全匹配始终排第一，其后是用过的条目，再由常规排名补足
+        ranked = self._search_ids(folded_query, limit)
+        exact = [item_id for item_id in ranked[:1] if self.folded[item_id] == folded_query]
+        seen = set(exact)
+        used = [item_id for item_id in used if item_id not in seen]
+        seen.update(used)
+        return (exact + used + [item_id for item_id in ranked if item_id not in seen])[:limit]
+
+    def _search_ids(self, folded_query, limit):
+        if folded_query and len(folded_query) < NGRAM and limit is not None:
+            return self._search_short(folded_query, limit)
+        ids = self.match_ids(folded_query)
+        key = self._rank_key(folded_query)
+        if limit is None or limit >= len(ids):
+            return sorted(ids, key=key)
+        return heapq.nsmallest(limit, ids, key=key)
+
+    def search_items(self, query, limit=20):
+        """排名前 limit 的 [(id, 原文), ...]，limit 为 None 时返回全部匹配"""
+        texts = self.texts
+        return [(item_id, texts[item_id]) for item_id in self.search_ids(query, limit)]
+
+    def search(self, query, limit=20):
+        """排名前 limit 的条目原文"""
+        texts = self.texts
+        return [texts[item_id] for item_id in self.search_ids(query, limit)]
+
+    def narrow_items(self, query, items):
+        """
+        items 是某个被 query 包含的较短查询的全部匹配，从中筛出仍然匹配 query 的条目，
+        结果与 search_items(query, None) 相同，但只扫描 items 而不是整张表。
+        items 按排名而非内存顺序排列，逐个访问比顺序扫描整表慢数倍，占比较大时直接重新搜索。
+        """
+        if len(items) * NARROW_RATIO > len(self.texts):
+            return self.search_items(query, None)
+        folded_query = query.casefold()
+        folded = self.folded
+        ids = [item_id for item_id, _ in items if folded_query in folded.get(item_id, "")]
+        ids.sort(key=self._rank_key(folded_query))
+        texts = self.texts
+        return [(item_id, texts[item_id]) for item_id in ids]
+
+class DatabaseSearch:
+    """
+    与 SearchIndex 接口一致的数据库搜索（FTS5 / LIKE），不把整张表载入内存。
+    数据变更由数据库触发器维护，因此增量更新方法都是空操作。
+    """
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    def reset_items(self, items):
+        pass
+
+    def set_usage(self, rows):
+        pass
+
+    def insert_item(self, item_id, text):
+        pass
+
+    def update_item(self, item_id, text):
+        pass
+
+    def remove_item(self, item_id):
+        pass
+
+    def match_ids(self, query):
+        return {item_id for item_id, _ in database.search_items(self.table_name, query, None)}
+
+    def search_ids(self, query, limit=20):
+        return [item_id for item_id, _ in database.search_items(self.table_name, query, limit)]
+
+    def search_items(self, query, limit=20):
+        return database.search_items(self.table_name, query, limit)
+
+    def search(self, query, limit=20):
+        return [text for _, text in database.search_items(self.table_name, query, limit)]
+
+    def narrow_items(self, query, items):
+        """在上一次的匹配结果中筛选，保持其顺序，不再访问数据库"""
+        folded_query = query.casefold()
+        return [(item_id, text) for item_id, text in items if folded_query in text.casefold()]
+
+class AttachedSearch:
+    """
+    联想用的组合搜索：当前词库的索引（SearchIndex 或 DatabaseSearch）加上 ATTACH 进来的其他词库。
+    当前词库的结果在前，其余名额由 database.search_attached 的结果按排名补足（文本不区分大小写去重）；
+    其他词库中的完全匹配在当前词库没有完全匹配时排在最前。没有挂载词库时等同于直接查询 index。
+    """
+    def __init__(self, index, table_name):
+        self.index = index
+        self.table_name = table_name
+
+    def search(self, query, limit=20):
+        results = self.index.search(query, limit)
+        attached = database.search_attached(self.table_name, query, limit)
+        if not attached:
+            return results
+        folded_query = query.casefold()
+        seen = {text.casefold() for text in results}
+        for _, text in attached:
+            folded = text.casefold()
+            if folded in seen: continue
+            seen.add(folded)
+            if folded == folded_query:
+                results.insert(0, text)
+            else:
+                results.append(text)
+        return results[:limit]
+
+class KeyValueAssociations:
+    """
+    键 -> 常搭配的值（database.get_key_values），按键懒加载并缓存。
+    值联想先在当前键的这几个值里找，候选集从整张值表缩小到少数几项。
+    """
+    def __init__(self, limit=200):
+        self.limit = limit
+        self._values = {}  # casefold 后的键 -> [(值, casefold 后的值), ...]，按排名值从高到低
+
+    def values_for(self, key_text):
+        key = key_text.casefold()
+        values = self._values.get(key)
+        if values is None:
+            values = [(value, value.casefold()) for value in database.get_key_values(key, self.limit)]
+            self._values[key] = values
+        return values
+
+    def search(self, key_text, query, limit=20):
+        """与 key_text 搭配过、且包含 query 的值，最多 limit 个"""
+        if not key_text:
+            return []
+        query = query.casefold()
+        return [value for value, folded in self.values_for(key_text) if query in folded][:limit]
+
+    def invalidate(self, key_text=None):
+        """key_text 为 None 时清空全部缓存"""
+        if key_text is None:
+            self._values.clear()
+        else:
+            self._values.pop(key_text.casefold(), None)
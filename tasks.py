@@ -0,0 +1,121 @@
+# tasks.py
+"""后台任务：在专用的数据库工作线程中串行执行导入/导出/批量读写，通过信号回报进度、结果和取消"""
+import queue
+import threading
+
+from PySide6.QtCore import QObject, QThread, Qt, Signal
+
+class TaskCancelled(Exception):
+    pass
+
+class Task(QObject):
+    """
+    一个后台任务。func(progress, *args, **kwargs) 在工作线程中运行，
+    其中 progress(done, total) 用于回报进度，任务被取消后再调用会抛出 TaskCancelled。
+    公开信号在 Task 所在的线程（提交任务的 GUI 线程）中发出。
+    """
+    progress = Signal(object, object)
+    finished = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal()
+    # 工作线程只发这个内部信号，它在构造时就以排队方式连到 _deliver；
+    # 结果总要等 GUI 线程回到事件循环才转发，所以 submit 之后再连接公开信号也不会错过
+    _outcome = Signal(str, object)
+    cancellable = True  # 写操作为 False：DbWorker.stop() 时照常执行完
+    def __init__(self, func, *args, **kwargs):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self._cancel_event = threading.Event()
+        self._owner = None
+        self._outcome.connect(self._deliver, Qt.QueuedConnection)
+    def cancel(self):
+        self._cancel_event.set()
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+    def report(self, done, total):
+        if self._cancel_event.is_set(): raise TaskCancelled()
+        self._outcome.emit("progress", (done, total))
+    def run(self):
+        if self._cancel_event.is_set():
+            self._outcome.emit("cancelled", None)
+            return
+        try:
+            result = self.func(self.report, *self.args, **self.kwargs)
+        except TaskCancelled:
+            self._outcome.emit("cancelled", None)
+        except Exception as e:
+            self._outcome.emit("failed", str(e))
+        else:
+            self._outcome.emit("finished", result)
+    def _deliver(self, kind, payload):
+        if kind == "progress":
+            self.progress.emit(*payload)
+            return
+        if kind == "finished": self.finished.emit(payload)
+        elif kind == "failed": self.failed.emit(payload)
+        else: self.cancelled.emit()
+        if self._owner is not None: self._owner.discard(self)
+
+class DbWorker(QThread):
+    """单一数据库工作线程：任务按提交顺序逐个执行，因此 SQLite 永远只有一个后台写者"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = queue.Queue()
+        self._current = None
+        self._stopping = False
+        self._active = set()  # 结果送达之前由这里持有 Task，调用方不必保存引用
+    def _enqueue(self, task):
+        task._owner = self._active
+        self._active.add(task)
+        self._queue.put(task)
+        return task
+    def submit(self, func, *args, **kwargs):
+        """提交任务并返回 Task，调用方连接其信号"""
+        return self._enqueue(Task(func, *args, **kwargs))
+    def submit_write(self, func, *args):
+        """
+        提交一次短小的写操作 func(*args)（不接收 progress），返回 Task，结果为 func 的返回值。
+        GUI 线程的写入都经由这里，与导入等长任务按提交顺序串行执行：GUI 线程从不等待写锁。
+        写操作不可取消，stop() 时也会执行完。
+        """
+        task = Task(lambda progress: func(*args))
+        task.cancellable = False
+        return self._enqueue(task)
+    def is_idle(self):
+        """提交过的任务是否都已送达结果（在 GUI 线程中调用）"""
+        return not self._active
+    def run(self):
+        while True:
+            task = self._queue.get()
+            if task is None: break
+            if self._stopping and task.cancellable: task.cancel()
+            self._current = task
+            task.run()
+            self._current = None
+    def stop(self):
+        """
+        取消正在执行和排队中的可取消任务，执行完排队中的写操作后等待线程退出
+        （须在提交任务的 GUI 线程中调用）
+        """
+        self._stopping = True
+        current = self._current
+        if current is not None and current.cancellable: current.cancel()
+        writes = []
+        while True:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is None: continue
+            if task.cancellable:
+                # 出队的任务不会再运行，直接在本线程发出 cancelled，等待它的调用方才能收尾
+                task.cancel()
+                task._deliver("cancelled", None)
+            else:
+                writes.append(task)
+        for task in writes:
+            self._queue.put(task)
+        self._queue.put(None)
+        self.wait()
@@ -0,0 +1,24 @@
+# tests/conftest.py
+"""每个用例在临时目录中使用一份全新的最新版本数据库"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_FILE", str(tmp_path / "quick_kv.db"))
+    database.ensure_db_tables()
+    yield database
+    database.close_db()
+
+@pytest.fixture
+def texts(db):
+    """texts(table_name)：表中非分组条目的文本，按树序"""
+    def texts(table_name="keys"):
+        return [text for _, text, _, is_group, _ in db.get_all_items(table_name) if not is_group]
+    return texts
@@ -0,0 +1,27 @@
+# tests/test_associations.py
+"""键值搭配：只给出仍在值表中的非分组值，按排名值从高到低"""
+
+def test_key_values_ranked_by_use(db):
+    for value in ("red", "green"):
+        db.add_item("value_items", value)
+    db.record_usage({}, [("Apple", "red"), ("apple", "green"), ("APPLE", "green")])
+    assert db.get_key_values("apple") == ["green", "red"]
+    assert db.get_key_values("apple", limit=1) == ["green"]
+
+def test_deleted_and_renamed_values_are_not_suggested(db):
+    red_id = db.add_item("value_items", "red")[1]
+    green_id = db.add_item("value_items", "green")[1]
+    db.add_item("value_items", "blue")
+    db.record_usage({}, [("apple", "red"), ("apple", "green"), ("apple", "blue")])
+    db.delete_item("value_items", red_id)
+    db.update_item_text("value_items", green_id, "lime")
+    assert db.get_key_values("apple") == ["blue"]
+    db.undo()
+    db.undo()
+    assert sorted(db.get_key_values("apple")) == ["blue", "green", "red"]
+
+def test_typed_values_and_groups_are_not_suggested(db):
+    db.add_item("value_items", "Red")
+    db.add_item("value_items", "colours", is_group=1)
+    db.record_usage({}, [("apple", "red"), ("apple", "colours"), ("apple", "never added")])
+    assert db.get_key_values("apple") == []
@@ -0,0 +1,82 @@
+# tests/test_journal.py
+"""操作日志：每种可撤销操作都能撤销回原状态，再重做回操作后的状态"""
+import os
+
+import pytest
+
+def rows(db):
+    return {table_name: db.get_all_items(table_name) for table_name in ("keys", "value_items")}
+
+def search(db, query):
+    return sorted(text for _, text in db.search_items("keys", query, None))
+
+def seed(db):
+    group_id = db.add_item("keys", "水果", is_group=1)[1]
+    apple_id = db.add_item("keys", "apple", parent_id=group_id)[1]
+    db.add_item("keys", "pear", parent_id=group_id)
+    db.add_item("keys", "plum")
+    db.add_item("value_items", "red")
+    return group_id, apple_id
+
+OPERATIONS = {
+    "add": lambda db, ids: db.add_item("keys", "banana"),
+    "rename": lambda db, ids: db.update_item_text("keys", ids[1], "apricot"),
+    "delete": lambda db, ids: db.delete_item("keys", ids[1]),
+    "delete_subtree": lambda db, ids: db.delete_item_recursive("keys", ids[0]),
+    "move": lambda db, ids: db.update_item_structure("keys", ids[1], 0, 1),
+    "reorder": lambda db, ids: db.update_sort_order("keys", list(reversed(db.get_item_ids("keys")))),
+    "merge": lambda db, ids: db.merge_items_stream([("keys", "plum"), ("keys", "fig")], remove_missing=True),
+    "replace": lambda db, ids: db.replace_all_items_stream([("keys", "x"), ("value_items", "y")]),
+}
+
+@pytest.mark.parametrize("name", OPERATIONS)
+def test_undo_then_redo_round_trips(db, name):
+    ids = seed(db)
+    original = rows(db)
+    OPERATIONS[name](db, ids)
+    changed = rows(db)
+    assert changed != original
+    assert db.journal_state()[0] is not None
+    assert db.undo()[0]
+    assert rows(db) == original
+    assert db.redo()[0]
+    assert rows(db) == changed
+    assert db.undo()[0]
+    assert rows(db) == original
+
+def test_undo_keeps_full_text_search_in_step(db):
+    ids = seed(db)
+    db.update_item_text("keys", ids[1], "apricot")
+    assert search(db, "apr") == ["apricot"]
+    db.undo()
+    assert search(db, "apr") == [] and search(db, "app") == ["apple"]
+    db.redo()
+    assert search(db, "apr") == ["apricot"]
+
+def test_undo_of_replace_import_keeps_usage_and_layouts(db):
+    seed(db)
+    db.replace_all_items_stream([("keys", "x")])
+    db.record_usage({"keys": ["x"]})
+    db.add_layout("新组合")
+    db.undo()
+    assert "新组合" in db.get_layouts()
+    assert [text for text, _ in db.get_usage("keys")] == ["x"]
+    assert search(db, "plu") == ["plum"]
+
+def test_new_operation_discards_redo(db):
+    seed(db)
+    db.add_item("keys", "banana")
+    db.undo()
+    db.add_item("keys", "cherry")
+    assert db.journal_state()[1] is None
+    assert db.redo() == (False, "没有可重做的操作")
+
+def test_undo_with_empty_journal(db):
+    assert db.journal_state() == (None, None)
+    assert db.undo() == (False, "没有可撤销的操作")
+
+def test_snapshots_are_limited(db):
+    seed(db)
+    for i in range(db.SNAPSHOT_LIMIT + 2):
+        db.replace_all_items_stream([("keys", f"import {i}")])
+    assert len(os.listdir(db.snapshot_dir())) == db.SNAPSHOT_LIMIT
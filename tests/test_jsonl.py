@@ -0,0 +1,94 @@
+# tests/test_jsonl.py
+"""JSONL 交换格式：完整往返；校验失败、截断或格式错误的文件被拒绝，且不改动数据库"""
+import gzip
+import json
+
+import pytest
+
+import data_io
+
+def seed(db):
+    group_id = db.add_item("keys", "组 \"引号\"", is_group=1)[1]
+    db.add_item("keys", "换行\n与\t制表", parent_id=group_id)
+    db.add_item("keys", "plain")
+    db.add_item("value_items", "值")
+
+def all_rows(db):
+    return {table_name: db.get_all_items(table_name) for table_name in ("keys", "value_items")}
+
+@pytest.mark.parametrize("file_name", ["export.jsonl", "export.jsonl.gz"])
+def test_round_trip_keeps_ids_groups_and_order(db, tmp_path, file_name, monkeypatch):
+    monkeypatch.setattr(data_io, "JSONL_CHUNK_ROWS", 2)  # 多块
+    seed(db)
+    original = all_rows(db)
+    path = str(tmp_path / file_name)
+    assert data_io.export_jsonl(path) == 4
+    db.replace_all_items_stream([("keys", "other")])
+    assert data_io.import_jsonl(path) == {"keys": 3, "value_items": 1}
+    assert all_rows(db) == original
+
+def exported_lines(db, tmp_path):
+    seed(db)
+    path = str(tmp_path / "export.jsonl")
+    data_io.export_jsonl(path)
+    with open(path, "rb") as f:
+        return f.read().splitlines(keepends=True)
+
+def write(tmp_path, lines, name="broken.jsonl"):
+    path = tmp_path / name
+    path.write_bytes(b"".join(lines))
+    return str(path)
+
+def assert_rejected(db, path, message):
+    before = all_rows(db)
+    with pytest.raises(ValueError, match=message):
+        data_io.import_jsonl(path)
+    assert all_rows(db) == before
+
+def test_corrupted_row_fails_the_checksum(db, tmp_path):
+    lines = exported_lines(db, tmp_path)
+    number = next(i for i, line in enumerate(lines) if b"plain" in line)
+    lines[number] = lines[number].replace(b"plain", b"plaim")
+    assert_rejected(db, write(tmp_path, lines), "校验失败")
+
+def test_dropped_row_fails_the_checksum(db, tmp_path):
+    lines = exported_lines(db, tmp_path)
+    del lines[next(i for i, line in enumerate(lines) if b"plain" in line)]
+    assert_rejected(db, write(tmp_path, lines), "校验失败")
+
+def test_truncated_file_is_rejected(db, tmp_path):
+    lines = exported_lines(db, tmp_path)
+    for cut in range(2, len(lines)):
+        with pytest.raises(ValueError):
+            data_io.import_jsonl(write(tmp_path, lines[:cut]))
+    assert all_rows(db)["keys"]
+
+def test_truncated_gzip_is_rejected(db, tmp_path):
+    lines = exported_lines(db, tmp_path)
+    data = gzip.compress(b"".join(lines))
+    path = tmp_path / "broken.jsonl.gz"
+    path.write_bytes(data[:len(data) // 2])
+    before = all_rows(db)
+    with pytest.raises((ValueError, EOFError)):
+        data_io.import_jsonl(str(path))
+    assert all_rows(db) == before
+
+def test_end_marker_with_wrong_counts_is_rejected(db, tmp_path):
+    lines = exported_lines(db, tmp_path)
+    end = json.loads(lines[-1])
+    end["rows"]["keys"] += 1
+    lines[-1] = (json.dumps(end) + "\n").encode("utf-8")
+    assert_rejected(db, write(tmp_path, lines), "行数")
+
+def test_other_files_are_rejected(db, tmp_path):
+    seed(db)
+    assert_rejected(db, write(tmp_path, [b'{"format": "something-else"}\n']), "不是 QuickKV JSONL")
+    header = {"format": data_io.JSONL_FORMAT, "version": data_io.JSONL_VERSION + 1}
+    assert_rejected(db, write(tmp_path, [(json.dumps(header) + "\n").encode("utf-8")]), "不支持的 JSONL 版本")
+
+def test_merge_from_jsonl_takes_only_entries(db, tmp_path):
+    lines = exported_lines(db, tmp_path)
+    db.replace_all_items_stream([("keys", "plain"), ("keys", "gone")])
+    stats = data_io.merge_jsonl(write(tmp_path, lines, "export.jsonl"), remove_missing=True)
+    assert stats["keys"] == {"inserted": 1, "removed": 1, "unchanged": 1}
+    assert sorted(row[1] for row in db.get_all_items("keys")) == ["plain", "换行\n与\t制表"]
@@ -0,0 +1,47 @@
+# tests/test_merge.py
+"""合并导入：按归一化哈希比对，只插入新条目；同步时删除文件中没有的条目"""
+def test_merge_inserts_only_new_entries(db, texts):
+    db.add_item("keys", "Apple")
+    stats = db.merge_items_stream([("keys", "apple "), ("keys", "pear"), ("keys", "PEAR"), ("value_items", "red")])
+    assert stats["keys"] == {"inserted": 1, "removed": 0, "unchanged": 1}
+    assert stats["value_items"] == {"inserted": 1, "removed": 0, "unchanged": 0}
+    assert texts("keys") == ["Apple", "pear"]
+    assert texts("value_items") == ["red"]
+
+def test_merge_keeps_ids_and_order_of_existing_entries(db):
+    for text in ("a", "b", "c"):
+        db.add_item("keys", text)
+    before = db.get_all_items("keys")
+    db.merge_items_stream([("keys", "c"), ("keys", "d"), ("keys", "a")])
+    after = db.get_all_items("keys")
+    assert after[:3] == before
+    assert after[3][1] == "d"
+
+def test_sync_removes_every_duplicate_of_a_missing_entry(db, texts):
+    for text in ("Apple", "apple", "pear"):
+        db.add_item("keys", text)
+    stats = db.merge_items_stream([("keys", "pear")], remove_missing=True)
+    assert stats["keys"] == {"inserted": 0, "removed": 2, "unchanged": 1}
+    assert texts("keys") == ["pear"]
+
+def test_sync_keeps_every_duplicate_of_a_present_entry(db, texts):
+    for text in ("Apple", "apple", "pear"):
+        db.add_item("keys", text)
+    stats = db.merge_items_stream([("keys", "APPLE")], remove_missing=True)
+    assert stats["keys"] == {"inserted": 0, "removed": 1, "unchanged": 1}
+    assert texts("keys") == ["Apple", "apple"]
+
+def test_sync_leaves_groups_alone(db):
+    db.add_item("keys", "group", is_group=1)
+    db.add_item("keys", "a")
+    db.merge_items_stream([], remove_missing=True)
+    assert [row[1] for row in db.get_all_items("keys")] == ["group"]
+
+def test_merge_is_one_undoable_operation(db, texts):
+    db.add_item("keys", "a")
+    db.merge_items_stream([("keys", "b"), ("keys", "c")], remove_missing=True)
+    assert texts("keys") == ["b", "c"]
+    assert db.undo()[0]
+    assert texts("keys") == ["a"]
+    assert db.redo()[0]
+    assert texts("keys") == ["b", "c"]
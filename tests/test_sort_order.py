@@ -0,0 +1,74 @@
+# tests/test_sort_order.py
+"""手动排序：plan_sort_order 只改写最长递增子序列之外的项，间隙不够时整体重新编号"""
+import random
+
+import database
+from database import SORT_GAP, plan_sort_order
+
+def changed(current, planned):
+    return sum(1 for old, new in zip(current, planned) if old != new)
+
+def test_plan_keeps_order_already_increasing():
+    current = [SORT_GAP * (i + 1) for i in range(5)]
+    assert plan_sort_order(current) == current
+
+def test_moving_one_item_rewrites_only_that_item():
+    orders = [SORT_GAP * (i + 1) for i in range(10)]
+    for source in range(10):
+        for target in range(10):
+            current = orders[:source] + orders[source + 1:]
+            current.insert(target, orders[source])
+            planned = plan_sort_order(current)
+            assert planned == sorted(planned) and len(set(planned)) == len(planned)
+            assert changed(current, planned) <= 1
+
+def test_plan_is_minimal_for_random_permutations():
+    rng = random.Random(7)
+    for _ in range(200):
+        current = [SORT_GAP * (i + 1) for i in range(rng.randint(0, 30))]
+        rng.shuffle(current)
+        planned = plan_sort_order(current)
+        assert all(a < b for a, b in zip(planned, planned[1:]))
+        assert changed(current, planned) == len(current) - len(database._increasing_positions(current))
+
+def test_plan_renumbers_when_the_gap_is_exhausted():
+    # 3 要落在相邻的 1 和 2 之间，没有空位
+    assert plan_sort_order([1, 3, 2, 4]) == [SORT_GAP * (i + 1) for i in range(4)]
+
+def test_plan_places_moved_items_before_and_after_the_kept_run():
+    assert plan_sort_order([3000, 1000, 2000]) == [1000 - SORT_GAP, 1000, 2000]
+    assert plan_sort_order([2000, 3000, 1000]) == [2000, 3000, 3000 + SORT_GAP]
+
+def test_update_sort_order_writes_only_changed_rows(db):
+    ids = [db.add_item("keys", f"k{i}")[1] for i in range(6)]
+    before = {row[0]: row[4] for row in db.get_all_items("keys")}
+    new_order = ids[1:4] + ids[:1] + ids[4:]
+    db.update_sort_order("keys", new_order)
+    after = {row[0]: row[4] for row in db.get_all_items("keys")}
+    assert [row[0] for row in db.get_all_items("keys")] == new_order
+    assert [item_id for item_id in ids if before[item_id] != after[item_id]] == [ids[0]]
+
+def test_reordering_records_moved_changes_not_a_reset(db):
+    ids = [db.add_item("keys", f"k{i}")[1] for i in range(4)]
+    change_sets = []
+    db.add_change_listener(change_sets.append)
+    try:
+        db.update_sort_order("keys", ids[1:] + ids[:1])
+        db.update_item_structure("keys", ids[1], 0, 1)
+        db.undo()
+    finally:
+        db.remove_change_listener(change_sets.append)
+    assert [[(c.table, c.kind, c.item_id) for c in change_set.changes] for change_set in change_sets] == [
+        [("keys", "moved", ids[0])], [("keys", "moved", ids[1])], [("keys", "moved", ids[1])]]
+
+def test_update_sort_order_plans_each_parent_separately(db):
+    group_id = db.add_item("keys", "group", is_group=1)[1]
+    top = [db.add_item("keys", f"t{i}")[1] for i in range(3)]
+    children = [db.add_item("keys", f"c{i}", parent_id=group_id)[1] for i in range(3)]
+    before = {row[0]: row[4] for row in db.get_all_items("keys")}
+    # 各分组的 sort_order 互相重叠：整体规划会改写另一组的全部子项，按分组规划只改写被拖动的那一项
+    db.update_sort_order("keys", [group_id] + top + [children[2], children[0], children[1]])
+    rows = db.get_all_items("keys")
+    assert [row[0] for row in rows if row[2] == 0] == [group_id] + top
+    assert [row[0] for row in rows if row[2] == group_id] == [children[2], children[0], children[1]]
+    assert [row[0] for row in rows if before[row[0]] != row[4]] == [children[2]]
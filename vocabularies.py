@@ -0,0 +1,129 @@
+# vocabularies.py
+"""
+词库登记表：多个具名的词库文件（每个都是一份独立的 QuickKV 数据库），不依赖 GUI。
+
+登记表保存在 REGISTRY_FILE（JSON）中，每个词库有名称、路径和是否参与联合搜索，current 为当前打开的词库。
+切换词库只是改写 database.DB_FILE：get_manager() 随之重建连接并广播 reset 变更，监听者据此整体刷新。
+其余参与联合搜索的词库以只读方式 ATTACH 到当前数据库的读连接上，由 database.search_attached 一起查询，
+数据不会被复制到当前词库中。
+"""
+import json
+import os
+from collections import namedtuple
+
+import database
+
+REGISTRY_FILE = "quick_kv_vocabularies.json"
+DEFAULT_NAME = "默认词库"
+DEFAULT_DB_FILE = database.DB_FILE
+
+Vocabulary = namedtuple("Vocabulary", "name path search")
+
+def _load():
+    if not os.path.exists(REGISTRY_FILE):
+        return {"current": DEFAULT_NAME, "vocabularies": [{"name": DEFAULT_NAME, "path": DEFAULT_DB_FILE, "search": False}]}
+    with open(REGISTRY_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save(registry):
+    # 先写临时文件再替换，写到一半崩溃也不会留下损坏的登记表
+    temp_file = REGISTRY_FILE + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(registry, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, REGISTRY_FILE)
+
+def list_vocabularies():
+    return [Vocabulary(entry["name"], entry["path"], bool(entry.get("search"))) for entry in _load()["vocabularies"]]
+
+def get_vocabulary(name):
+    return next((vocabulary for vocabulary in list_vocabularies() if vocabulary.name == name), None)
+
+def current_name():
+    return _load()["current"]
+
+def current_path():
+    """当前词库的文件路径（登记表不存在时即默认的 quick_kv.db）"""
+    vocabulary = get_vocabulary(current_name()) or list_vocabularies()[0]
+    return vocabulary.path
+
+def add_vocabulary(name, path, search=False):
+    """登记一个词库文件；文件不存在时新建，版本过旧时升级"""
+    if not name: return False, "名称不能为空"
+    registry = _load()
+    path = os.path.abspath(path)
+    for entry in registry["vocabularies"]:
+        if entry["name"] == name: return False, "该名称已存在"
+        if os.path.abspath(entry["path"]) == path: return False, f"该文件已登记为词库“{entry['name']}”"
+    try:
+        database.ensure_db_tables(path)
+    except Exception as e:
+        return False, f"无法打开词库文件: {e}"
+    registry["vocabularies"].append({"name": name, "path": path, "search": search})
+    _save(registry)
+    if search: apply_attachments()
+    return True, "添加成功"
+
+def rename_vocabulary(old_name, new_name):
+    if not new_name: return False, "名称不能为空"
+    registry = _load()
+    if any(entry["name"] == new_name for entry in registry["vocabularies"]): return False, "该名称已存在"
+    for entry in registry["vocabularies"]:
+        if entry["name"] == old_name:
+            entry["name"] = new_name
+            break
+    else:
+        return False, "词库不存在"
+    if registry["current"] == old_name: registry["current"] = new_name
+    _save(registry)
+    apply_attachments()
+    return True, "重命名成功"
+
+def remove_vocabulary(name):
+    """只从登记表中移除，不删除文件；当前打开的词库不能移除"""
+    registry = _load()
+    if registry["current"] == name: return False, "不能移除当前打开的词库"
+    remaining = [entry for entry in registry["vocabularies"] if entry["name"] != name]
+    if len(remaining) == len(registry["vocabularies"]): return False, "词库不存在"
+    registry["vocabularies"] = remaining
+    _save(registry)
+    apply_attachments()
+    return True, "已移除"
+
+def set_search(name, enabled):
+    """设置词库是否参与联合搜索"""
+    registry = _load()
+    for entry in registry["vocabularies"]:
+        if entry["name"] == name:
+            entry["search"] = bool(enabled)
+    _save(registry)
+    apply_attachments()
+
+def apply_attachments():
+    """把当前词库之外、参与联合搜索且文件存在的词库挂到当前数据库上"""
+    current = current_name()
+    database.set_attached([(vocabulary.name, vocabulary.path) for vocabulary in list_vocabularies()
+                           if vocabulary.search and vocabulary.name != current and os.path.exists(vocabulary.path)])
+
+def switch_to(name):
+    """切换当前词库，无需重启；监听者会收到 reset 变更"""
+    vocabulary = get_vocabulary(name)
+    if vocabulary is None: return False, "词库不存在"
+    previous = database.DB_FILE
+    database.DB_FILE = vocabulary.path
+    try:
+        database.ensure_db_tables()
+    except Exception as e:
+        database.DB_FILE = previous
+        return False, f"无法打开词库: {e}"
+    registry = _load()
+    registry["current"] = name
+    _save(registry)
+    apply_attachments()
+    return True, f"已切换到词库“{name}”"
+
+def open_current():
+    """启动时打开登记表中的当前词库（登记表不存在时即默认的 quick_kv.db）"""
+    database.DB_FILE = current_path()
+    database.ensure_db_tables()
+    apply_attachments()
+    return database.DB_FILE